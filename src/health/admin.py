@@ -1,7 +1,11 @@
 from django.contrib import admin
+from router.admin import ScalableAdmin
 from . import models
 
-admin.site.register(models.Patient)
-admin.site.register(models.Case)
-admin.site.register(models.MuacMeasurement)
-admin.site.register(models.Aggregate)
+class ReportAdmin(ScalableAdmin):
+    date_field = 'time'
+
+admin.site.register(models.Patient, ScalableAdmin)
+admin.site.register(models.Case, ScalableAdmin)
+admin.site.register(models.MuacMeasurement, ReportAdmin)
+admin.site.register(models.Aggregate, ReportAdmin)
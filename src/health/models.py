@@ -98,9 +98,6 @@ class Report(Model):
     time = models.DateTimeField(db_index=True)
     tags = ()
 
-    class Meta:
-        ordering = ['-id']
-
 class Tag(Model):
     report = models.ForeignKey(Report, related_name="tags")
     value = models.CharField(max_length=20)
@@ -180,6 +177,7 @@ class Epi(Form):
         }
 
     prompt = "EPI: "
+    keywords = ('epi',)
 
     @pico.wrap
     def parse(cls):
@@ -234,8 +232,8 @@ class Epi(Form):
             for code, value in sorted(aggregates.items()):
                 stat = "%s %d" % (self.TOKENS[code].lower(), value)
                 previous = Aggregate.objects.filter(
-                    code=code, reporter=self.user)
-                if len(previous):
+                    code=code, reporter=self.user).order_by('-id')[:1]
+                if previous:
                     aggregate = previous[0]
                     if value > 0 and aggregate.value > 0:
                         ratio = 100 * (float(value)/aggregate.value - 1)
@@ -286,6 +284,7 @@ class Muac(Form):
     """
 
     prompt = "MUAC: "
+    keywords = ('muac',)
 
     @staticmethod
     def get_reading_in_mm(reading):
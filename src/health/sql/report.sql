@@ -0,0 +1 @@
+CREATE INDEX health_report_reporter_id_time ON health_report (reporter_id, time);
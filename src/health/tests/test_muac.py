@@ -197,7 +197,7 @@ class FormTest(FormTestCase):
         for reading, category in ((140, 'G'), (125, 'Y'), (110, 'R')):
             self._muac(health_id='bob123', reading=reading)
             from health.models import MuacMeasurement
-            report = MuacMeasurement.objects.all()[0]
+            report = MuacMeasurement.objects.order_by('-id')[0]
             self.assertEqual(report.category, category)
 
     def test_patient_age_is_datetime(self):
@@ -45,6 +45,7 @@ class Registration(Form):
     """
 
     prompt = "REGISTER: "
+    keywords = ('reg', 'register')
 
     @pico.wrap
     def parse(cls):
@@ -83,13 +84,16 @@ class Registration(Form):
     def handle(self, name=None, ident=None):
         if self.user is None:
             if ident is not None:
-                # identify user using ``ident`` and add this peer
-                peer = Peer.objects.get(uri__endswith="://%s" % ident)
-                if peer.user is None:
+                # identify user using ``ident`` and add this peer; if
+                # the device is known on several transports, the first
+                # registered one (by uri) is used
+                peers = Peer.base_objects.select_related('user').filter(
+                    ident=ident, user__isnull=False).order_by('uri')[:1]
+                if not peers:
                     self.reply("We did not find an existing registration "
                                "identified by: %s." % ident)
                 else:
-                    peer.user.peers.add(self.message.peer)
+                    peers[0].user.peers.add(self.message.peer)
                     self.message.peer.save()
                     self.reply("Thank you for your registration.")
             elif name is not None:
@@ -71,3 +71,13 @@ class HandlerTest(FormTestCase):
         form = self._register(uri="test://new", ident="new")
         self.assertEqual(form.user, None)
         self.assertTrue('new' in form.replies.get().text)
+
+    def test_register_new_device_known_on_several_transports(self):
+        from router.models import Peer
+        Peer(uri="a://+123").save()
+        self._register(uri="b://123", name="foo")
+        self._register(uri="c://123", name="bar")
+        form = self._register(uri="test://new", ident="123")
+        from .models import Reporter
+        self.assertEqual(form.message.peer.user_id, Reporter.objects.get(
+            name="foo").pk)
@@ -1,8 +1,205 @@
+from datetime import date
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import InvalidPage
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db import DatabaseError
+from django.db import DEFAULT_DB_ALIAS
+
 from . import models
+from .search import search
+
+# The number of matching rows is counted up to this limit
+COUNT_LIMIT = 1000
+
+# Keyset pagination settings
+NEXT_VAR = 'next'
+PREV_VAR = 'prev'
+
+def estimate_count(model):
+    """Return an estimate of the number of rows in the table of
+    ``model``.
+
+    On PostgreSQL, the estimate is read from the planner statistics;
+    on SQLite, from the statistics gathered by ``ANALYZE``. Returns
+    ``None`` if there are no statistics.
+    """
+
+    connection = connections[DEFAULT_DB_ALIAS]
+    engine = connection.settings_dict['ENGINE'].split('.')[-1]
+    table = model._meta.db_table
+    cursor = connection.cursor()
+    row = None
+
+    if engine in ('postgresql_psycopg2', 'postgis'):
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE relname = %s", [table])
+        row = cursor.fetchone()
+    elif engine in ('sqlite3', 'spatialite'):
+        try:
+            cursor.execute(
+                "SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+        except DatabaseError:
+            # the database has not been analyzed
+            pass
+        else:
+            row = cursor.fetchone()
+            if row is not None:
+                row = row[0].split()[:1]
+
+    if row and float(row[0]) > 0:
+        return int(float(row[0]))
+
+class ScalableChangeList(ChangeList):
+    """Change list for large tables.
+
+    When the list is ordered by primary key (the default), pages are
+    selected using keyset pagination: the ``next`` and ``prev`` query
+    parameters give the key of the last (or first) row shown, such
+    that each page is a range scan on the primary key index instead
+    of an offset. The number of matching rows is counted up to
+    ``COUNT_LIMIT`` and the total is estimated (see
+    :func:`estimate_count`), or if there are no statistics, also
+    counted up to ``COUNT_LIMIT`` (shown as e.g. ``"1000+"``).
+
+    If the admin class has a ``date_field``, the list is limited to
+    the last ``ADMIN_DATE_RANGE`` days (default is ``30``) unless a
+    filter on that field is given.
+    """
+
+    next = prev = None
+
+    def get_query_set(self):
+        if NEXT_VAR in self.params:
+            self.next = self.params.pop(NEXT_VAR)
+        if PREV_VAR in self.params:
+            self.prev = self.params.pop(PREV_VAR)
+
+        field = getattr(self.model_admin, 'date_field', None)
+        days = getattr(settings, 'ADMIN_DATE_RANGE', 30)
+        if field is not None and days:
+            prefix = field + '__'
+            for name in self.params:
+                if name.startswith(prefix):
+                    break
+            else:
+                since = date.today() - timedelta(days=days)
+                self.params[prefix + 'gte'] = since.isoformat()
+
+        return super(ScalableChangeList, self).get_query_set()
+
+    def get_results(self, request):
+        queryset = self.query_set
+        keys = list(queryset.order_by().values_list(
+            'pk', flat=True)[:COUNT_LIMIT + 1])
+        self.result_count = min(len(keys), COUNT_LIMIT)
+        self.result_count_capped = len(keys) > COUNT_LIMIT
+        self.full_result_count = estimate_count(self.model)
+        if self.full_result_count is None:
+            count = len(self.model._base_manager.values_list(
+                'pk', flat=True)[:COUNT_LIMIT + 1])
+            if count > COUNT_LIMIT:
+                self.full_result_count = u"%d+" % COUNT_LIMIT
+            else:
+                self.full_result_count = count
+        self.multi_page = len(keys) > self.list_per_page
+        self.can_show_all = False
+        self.next_url = self.prev_url = None
+
+        pk = self.lookup_opts.pk.name
+        self.keyset = self.order_field == pk
+        if not self.keyset:
+            # fall back to offset pagination over the counted rows
+            self.paginator = Paginator(queryset, self.list_per_page)
+            self.paginator._count = self.result_count
+            try:
+                self.result_list = self.paginator.page(
+                    self.page_num + 1).object_list
+            except InvalidPage:
+                raise IncorrectLookupParameters
+            return
+
+        self.paginator = None
+        descending = self.order_type == 'desc'
+        ordering = descending and '-' + pk or pk
+        reverse = descending and pk or '-' + pk
+
+        try:
+            if self.prev is not None:
+                lookup = descending and '__gt' or '__lt'
+                page = queryset.filter(**{pk + lookup: self.prev}).\
+                       order_by(reverse)
+            elif self.next is not None:
+                lookup = descending and '__lt' or '__gt'
+                page = queryset.filter(**{pk + lookup: self.next}).\
+                       order_by(ordering)
+            else:
+                page = queryset.order_by(ordering)
+            keys = list(page.values_list(
+                'pk', flat=True)[:self.list_per_page + 1])
+        except (ValueError, DatabaseError):
+            raise IncorrectLookupParameters
+
+        more = len(keys) > self.list_per_page
+        keys = keys[:self.list_per_page]
+        if self.prev is not None:
+            keys.reverse()
+
+        self.result_list = queryset.filter(pk__in=keys).order_by(ordering)
+
+        if keys:
+            if self.prev is not None and more or self.next is not None:
+                self.prev_url = self.get_query_string({PREV_VAR: keys[0]})
+            if self.prev is not None or more:
+                self.next_url = self.get_query_string({NEXT_VAR: keys[-1]})
+
+class SearchChangeList(ScalableChangeList):
+    """Change list which uses the full-text search index to look up
+    the search query instead of matching each of the search fields."""
+
+    def get_query_set(self):
+        query = self.query
+        self.query = ''
+        try:
+            queryset = super(SearchChangeList, self).get_query_set()
+        finally:
+            self.query = query
+        return search(query, queryset)
+
+class ScalableAdmin(admin.ModelAdmin):
+    change_list_template = "router/admin/change_list.html"
+    date_field = None
+
+    def get_changelist(self, request, **kwargs):
+        return ScalableChangeList
+
+    def lookup_allowed(self, lookup, value):
+        if self.date_field is not None and \
+               lookup.startswith(self.date_field + '__'):
+            return True
+        return super(ScalableAdmin, self).lookup_allowed(lookup, value)
+
+class SearchAdmin(ScalableAdmin):
+    search_fields = ('text', )
+    date_field = 'time'
+
+    def get_changelist(self, request, **kwargs):
+        return SearchChangeList
+
+class FormAdmin(SearchAdmin):
+    date_field = 'message__time'
+
+class OutgoingAdmin(SearchAdmin):
+    # unsent messages have no time
+    date_field = None
 
-admin.site.register(models.User)
-admin.site.register(models.Peer)
-admin.site.register(models.Form)
-admin.site.register(models.Incoming)
-admin.site.register(models.Outgoing)
+admin.site.register(models.User, ScalableAdmin)
+admin.site.register(models.Peer, ScalableAdmin)
+admin.site.register(models.Form, FormAdmin)
+admin.site.register(models.Incoming, SearchAdmin)
+admin.site.register(models.Outgoing, OutgoingAdmin)
@@ -0,0 +1,199 @@
+import os
+import sqlite3
+
+from datetime import date
+
+from django.db import connections
+from django.db import DEFAULT_DB_ALIAS
+from django.db import transaction
+from django.contrib.contenttypes.models import ContentType
+
+from .models import Form
+from .models import Incoming
+from .models import Message
+from .models import Outgoing
+from .models import Pending
+
+def filename(path, time):
+    """Return the path of the archive file for the month of ``time``
+    in the directory ``path``."""
+
+    return os.path.join(path, "messages-%04d-%02d.db" % (
+        time.year, time.month))
+
+def tables(model):
+    """Return ``(table, primary key column)`` tuples for the tables
+    which hold the rows of ``model``, from the model itself up to the
+    root of its inheritance tree."""
+
+    result = []
+    for cls in model.__mro__:
+        meta = getattr(cls, '_meta', None)
+        if meta is None or meta.abstract or not meta.managed:
+            continue
+        if meta.proxy:
+            continue
+        pair = meta.db_table, meta.pk.column
+        if pair not in result:
+            result.append(pair)
+    return result
+
+def archive(path, before, batch=1000, limit=None):
+    """Move messages older than ``before`` into monthly SQLite files
+    in the directory ``path``.
+
+    An incoming message is archived together with its forms and
+    their replies, unless a reply has not been sent yet. Outgoing
+    messages which are not replies are archived once sent. The rows
+    are copied to tables of the same name and columns in the archive
+    file for the month in which the message was received (or sent),
+    then deleted.
+
+    At most ``batch`` messages are archived in each transaction,
+    stopping when there are no more messages to archive or after
+    ``limit`` messages (if given). Returns the number of messages
+    archived.
+    """
+
+    count = 0
+    while limit is None or count < limit:
+        if limit is not None:
+            batch = min(batch, limit - count)
+        archived = _archive_batch(path, before, batch)
+        if not archived:
+            break
+        count += archived
+    return count
+
+def _archive_batch(path, before, batch):
+    transaction.enter_transaction_management()
+    transaction.managed(True)
+    try:
+        try:
+            months = _select(before, batch)
+            count = 0
+            for (year, month), rows in sorted(months.items()):
+                _copy(filename(path, date(year, month, 1)), rows)
+                count += len(rows.get(Message, ()))
+            for rows in months.values():
+                _delete(rows)
+            transaction.commit()
+        except:
+            transaction.rollback()
+            raise
+    finally:
+        transaction.leave_transaction_management()
+    return count
+
+def _select(before, batch):
+    """Return a dictionary mapping ``(year, month)`` to a dictionary
+    which maps models to the primary keys to be archived."""
+
+    months = {}
+
+    def add(time, model, pks):
+        rows = months.setdefault((time.year, time.month), {})
+        rows.setdefault(model, []).extend(pks)
+
+    # skip messages which have replies waiting to be sent
+    waiting = Pending.objects.filter(
+        message__in_reply_to__message__time__lt=before).values_list(
+        'message__in_reply_to__message', flat=True)
+
+    times = {}
+    for pk, time in Incoming.base_objects.filter(time__lt=before).exclude(
+        pk__in=list(waiting)).order_by('time').values_list(
+        'pk', 'time')[:batch]:
+        times[pk] = time
+        add(time, Incoming, [pk])
+        add(time, Message, [pk])
+
+    forms = {}
+    for pk, message, ctype in Form.base_objects.filter(
+        message__in=times.keys()).values_list(
+        'pk', 'message', 'polymorphic_ctype'):
+        forms[pk] = times[message]
+        add(times[message], ContentType.objects.get_for_id(
+            ctype).model_class(), [pk])
+
+    for pk, form in Outgoing.base_objects.filter(
+        in_reply_to__in=forms.keys()).values_list('pk', 'in_reply_to'):
+        add(forms[form], Outgoing, [pk])
+        add(forms[form], Message, [pk])
+
+    remaining = batch - len(times)
+    if remaining > 0:
+        for pk, time in Outgoing.base_objects.filter(
+            in_reply_to=None, time__lt=before).order_by(
+            'time').values_list('pk', 'time')[:remaining]:
+            add(time, Outgoing, [pk])
+            add(time, Message, [pk])
+
+    return months
+
+def _rows(rows):
+    """Return ``(table, column, pks)`` tuples for the rows to archive,
+    in an order which is safe for deletion."""
+
+    result = []
+    index = {}
+
+    def add(pairs, pks):
+        for table, column in pairs:
+            if table not in index:
+                index[table] = set()
+                result.append((table, column, index[table]))
+            index[table].update(pks)
+
+    # the tables of form subclasses, most derived first
+    forms = [model for model in rows if issubclass(model, Form)]
+    forms.sort(key=lambda model: -len(tables(model)))
+    for model in forms:
+        add(tables(model)[:-1], rows[model])
+
+    add(tables(Outgoing)[:1], rows.get(Outgoing, ()))
+    for model in forms:
+        add(tables(Form), rows[model])
+    add(tables(Incoming)[:1], rows.get(Incoming, ()))
+    add(tables(Message), rows.get(Message, ()))
+
+    return [(table, column, sorted(pks))
+            for (table, column, pks) in result if pks]
+
+def _copy(name, rows):
+    connection = connections[DEFAULT_DB_ALIAS]
+    cursor = connection.cursor()
+    qn = connection.ops.quote_name
+    archive = sqlite3.connect(name)
+    try:
+        for table, column, pks in _rows(rows):
+            for chunk in _chunks(pks):
+                cursor.execute("SELECT * FROM %s WHERE %s IN (%s)" % (
+                    qn(table), qn(column), ", ".join(["%s"] * len(chunk))),
+                               chunk)
+                columns = [d[0] for d in cursor.description]
+                archive.execute(
+                    "CREATE TABLE IF NOT EXISTS %s (%s, PRIMARY KEY (%s))" % (
+                        qn(table), ", ".join(map(qn, columns)), qn(column)))
+                archive.executemany(
+                    "INSERT OR REPLACE INTO %s (%s) VALUES (%s)" % (
+                        qn(table), ", ".join(map(qn, columns)),
+                        ", ".join(["?"] * len(columns))),
+                    cursor.fetchall())
+        archive.commit()
+    finally:
+        archive.close()
+
+def _delete(rows):
+    connection = connections[DEFAULT_DB_ALIAS]
+    cursor = connection.cursor()
+    qn = connection.ops.quote_name
+    for table, column, pks in _rows(rows):
+        for chunk in _chunks(pks):
+            cursor.execute("DELETE FROM %s WHERE %s IN (%s)" % (
+                qn(table), qn(column), ", ".join(["%s"] * len(chunk))),
+                           chunk)
+
+def _chunks(pks, size=500):
+    for i in range(0, len(pks), size):
+        yield pks[i:i+size]
@@ -0,0 +1,73 @@
+from collections import OrderedDict
+from threading import Lock
+
+class LRUCache(object):
+    """Mapping with a bounded number of items.
+
+    When the cache is full, the least recently used item is evicted
+    to make room for a new one. The cache is safe for use by multiple
+    threads.
+
+    >>> cache = LRUCache(2)
+    >>> cache.set('a', 1)
+    >>> cache.set('b', 2)
+    >>> cache.get('a')
+    1
+    >>> cache.set('c', 3)
+    >>> cache.get('b') is None
+    True
+    >>> len(cache)
+    2
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        """Return the item for ``key`` and mark it as recently used."""
+
+        self._lock.acquire()
+        try:
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                return default
+            self._items[key] = value
+            return value
+        finally:
+            self._lock.release()
+
+    def set(self, key, value):
+        """Store ``value`` for ``key``, evicting items as needed."""
+
+        self._lock.acquire()
+        try:
+            self._items.pop(key, None)
+            self._items[key] = value
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+        finally:
+            self._lock.release()
+
+    def discard(self, key):
+        """Remove the item for ``key`` if present."""
+
+        self._lock.acquire()
+        try:
+            self._items.pop(key, None)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """Remove all items."""
+
+        self._lock.acquire()
+        try:
+            self._items.clear()
+        finally:
+            self._lock.release()
@@ -0,0 +1,75 @@
+from threading import Lock
+from threading import Timer
+
+from django.dispatch import Signal as BaseSignal
+
+class Signal(BaseSignal):
+    """Signal which costs nothing to send when there are no receivers.
+
+    Senders on the routing path check :attr:`active` before building
+    the arguments and calling :meth:`send`.
+    """
+
+    @property
+    def active(self):
+        """Return ``True`` if any receivers are connected."""
+
+        return bool(self.receivers)
+
+class BatchSignal(Signal):
+    """Signal which delivers events in batches.
+
+    Senders call :meth:`add` with a single event; receivers are
+    called with a list of events in the ``events`` argument when
+    ``size`` events have been collected, ``interval`` seconds after
+    the first event of the batch was added (from a timer thread; set
+    ``interval`` to ``None`` to disable), or when :meth:`flush` is
+    called. Events are dropped if no receivers are connected.
+    """
+
+    def __init__(self, size=100, interval=10.0):
+        super(BatchSignal, self).__init__(providing_args=["events"])
+        self.size = size
+        self.interval = interval
+        self._events = []
+        self._lock = Lock()
+        self._timer = None
+
+    def add(self, event):
+        """Add ``event`` to the current batch."""
+
+        if not self.receivers:
+            return
+
+        self._lock.acquire()
+        try:
+            self._events.append(event)
+            if len(self._events) < self.size:
+                if self._timer is None and self.interval is not None:
+                    self._timer = Timer(self.interval, self.flush)
+                    self._timer.setDaemon(True)
+                    self._timer.start()
+                return
+            events, self._events = self._events, []
+            timer, self._timer = self._timer, None
+        finally:
+            self._lock.release()
+
+        if timer is not None:
+            timer.cancel()
+        self.send(sender=self, events=events)
+
+    def flush(self, **kwargs):
+        """Deliver the current batch (if not empty)."""
+
+        self._lock.acquire()
+        try:
+            events, self._events = self._events, []
+            timer, self._timer = self._timer, None
+        finally:
+            self._lock.release()
+
+        if timer is not None:
+            timer.cancel()
+        if events:
+            self.send(sender=self, events=events)
@@ -0,0 +1,164 @@
+import socket
+
+from errno import ECONNRESET
+from errno import EPIPE
+from httplib import BadStatusLine
+from httplib import HTTPConnection
+from httplib import HTTPException
+from httplib import HTTPSConnection
+from threading import Lock
+from time import time as get_time
+from urllib2 import URLError
+from urlparse import urlsplit
+
+class Response(object):
+    """Response returned by :meth:`ConnectionPool.urlopen`; the body
+    has been read such that the connection can be reused."""
+
+    def __init__(self, url, code, msg, headers, body):
+        self.url = url
+        self.code = code
+        self.msg = msg
+        self.headers = headers
+        self.body = body
+
+    def geturl(self):
+        return self.url
+
+    def info(self):
+        return self.headers
+
+    def read(self):
+        return self.body
+
+class ConnectionPool(object):
+    """Pool of persistent (keep-alive) HTTP connections.
+
+    At most ``size`` idle connections are kept for each host; a
+    connection which has been idle for more than ``idle_timeout``
+    seconds is closed instead of being reused. When all connections
+    are in use, a new connection is opened (and closed after the
+    request if the pool is full).
+
+    A request on a reused connection which fails because the server
+    has closed the connection is retried once on a new connection;
+    that is, if the request could not be sent or the connection was
+    closed without a response. Other errors (including timeouts) are
+    not retried since the request may have been processed.
+    """
+
+    connection_classes = {
+        'http': HTTPConnection,
+        'https': HTTPSConnection,
+        }
+
+    def __init__(self, size=4, idle_timeout=30.0):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._lock = Lock()
+
+    def urlopen(self, request, timeout=None):
+        """Send ``request`` (a :class:`urllib2.Request`) and return a
+        :class:`Response`. Unlike :func:`urllib2.urlopen`, responses
+        with an error status are returned, not raised; connection
+        errors are raised as :class:`urllib2.URLError`."""
+
+        url = request.get_full_url()
+        scheme, netloc, path, query, fragment = urlsplit(url)
+        if scheme not in self.connection_classes:
+            raise URLError("unknown url type: %s" % scheme)
+        key = scheme, netloc
+
+        path = path or "/"
+        if query:
+            path += "?" + query
+
+        headers = dict(request.header_items())
+        data = request.get_data()
+        method = request.get_method()
+
+        connection = self._acquire(key)
+        reused = connection is not None
+        while True:
+            if connection is None:
+                connection = self.connection_classes[scheme](
+                    netloc, timeout=timeout)
+            else:
+                connection.timeout = timeout
+                if connection.sock is not None:
+                    connection.sock.settimeout(timeout)
+
+            # a reused connection is stale if the server closed it
+            # before the request got through or without a response
+            stale = False
+            try:
+                try:
+                    connection.request(method, path, data, headers)
+                except socket.timeout:
+                    raise
+                except socket.error, exc:
+                    stale = exc.args[:1] in ((ECONNRESET, ), (EPIPE, ))
+                    raise
+                try:
+                    response = connection.getresponse()
+                except BadStatusLine:
+                    stale = True
+                    raise
+                body = response.read()
+            except (HTTPException, socket.error), exc:
+                connection.close()
+                connection = None
+                if reused and stale:
+                    reused = False
+                    continue
+                raise URLError(exc)
+            break
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(key, connection)
+
+        return Response(
+            url, response.status, response.reason, response.msg, body)
+
+    def close(self, *args, **kwargs):
+        """Close all idle connections."""
+
+        self._lock.acquire()
+        try:
+            idle, self._idle = self._idle, {}
+        finally:
+            self._lock.release()
+
+        for connections in idle.values():
+            for connection, time in connections:
+                connection.close()
+
+    def _acquire(self, key):
+        expired = []
+        self._lock.acquire()
+        try:
+            connections = self._idle.get(key, [])
+            limit = get_time() - self.idle_timeout
+            while connections and connections[0][1] < limit:
+                expired.append(connections.pop(0)[0])
+            if connections:
+                return connections.pop()[0]
+        finally:
+            self._lock.release()
+            for connection in expired:
+                connection.close()
+
+    def _release(self, key, connection):
+        self._lock.acquire()
+        try:
+            connections = self._idle.setdefault(key, [])
+            if len(connections) < self.size:
+                connections.append((connection, get_time()))
+                return
+        finally:
+            self._lock.release()
+
+        connection.close()
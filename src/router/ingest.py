@@ -0,0 +1,124 @@
+import logging
+
+from Queue import Empty
+from Queue import Queue
+from threading import Lock
+from threading import Thread
+
+from django.db import connections
+
+_stop = object()
+
+class Ingest(object):
+    """Route messages in a pool of worker threads.
+
+    Messages are put on a queue of at most ``size`` items and passed
+    to ``route`` by one of ``workers`` threads, which are started on
+    first use. When the queue is full, :meth:`put` blocks until a
+    worker is available.
+
+    Each worker thread uses its own database connection, which is
+    closed when the worker stops or an error occurs. Errors are logged
+    to ``logger`` (default is ``"router.ingest"``).
+
+    If ``batch`` is set, ``route`` is instead called with a list of
+    up to ``batch`` queued messages at a time.
+
+    The queue is kept in memory; messages which are queued when the
+    process exits are not routed (see :meth:`stop`). Once stopped,
+    the ingest can't be used again.
+    """
+
+    def __init__(self, route, workers=1, size=1000, logger="router.ingest",
+                 batch=0):
+        self.route = route
+        self.workers = workers
+        self.batch = batch
+        self.logger = logging.getLogger(logger)
+        self._queue = Queue(size)
+        self._lock = Lock()
+        self._threads = []
+        self._stopped = False
+
+    def put(self, message):
+        """Queue ``message`` for routing. Raises :exc:`RuntimeError`
+        if the ingest has been stopped."""
+
+        if self._stopped:
+            raise RuntimeError("Ingest has been stopped.")
+
+        if not self._threads:
+            self._lock.acquire()
+            try:
+                if self._stopped:
+                    raise RuntimeError("Ingest has been stopped.")
+                if not self._threads:
+                    self.start()
+            finally:
+                self._lock.release()
+
+        self._queue.put(message)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = Thread(target=self.run)
+            thread.setDaemon(True)
+            thread.start()
+            self._threads.append(thread)
+
+    def run(self):
+        try:
+            stop = False
+            while not stop:
+                messages = [self._queue.get()]
+                while len(messages) < self.batch and \
+                          messages[-1] is not _stop:
+                    try:
+                        messages.append(self._queue.get_nowait())
+                    except Empty:
+                        break
+
+                if messages[-1] is _stop:
+                    stop = True
+                    messages.pop()
+
+                try:
+                    if not messages:
+                        continue
+                    item = self.batch and messages or messages[0]
+                    self.route(item)
+                except Exception, exc:
+                    self.logger.warn("Unable to process %r (%s)." % (
+                        item, exc))
+                    self._close()
+                finally:
+                    for i in range(len(messages) + stop):
+                        self._queue.task_done()
+        finally:
+            self._close()
+
+    def join(self):
+        """Block until all queued messages have been routed."""
+
+        self._queue.join()
+
+    def stop(self, *args, **kwargs):
+        """Stop the worker threads after the queued messages have
+        been routed."""
+
+        self._lock.acquire()
+        try:
+            self._stopped = True
+            threads = self._threads
+            self._threads = []
+            for thread in threads:
+                self._queue.put(_stop)
+            for thread in threads:
+                thread.join()
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _close():
+        for connection in connections.all():
+            connection.close()
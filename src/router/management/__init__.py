@@ -1 +1,9 @@
-#
+from django.db.models import signals
+
+from router import models
+from router import search
+
+def install_search(sender=None, **kwargs):
+    search.install()
+
+signals.post_syncdb.connect(install_search, sender=models)
@@ -0,0 +1,36 @@
+from datetime import datetime
+from datetime import timedelta
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import NoArgsCommand
+from django.core.management.base import CommandError
+
+from router.archive import archive
+
+class Command(NoArgsCommand):
+    help = 'Moves old messages into monthly archive files'
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--age', action='store', dest='age', type='int',
+                    help='Archive messages older than this number of days '
+                    '(the default is the ARCHIVE_AGE setting or 90).'),
+        make_option('--batch', action='store', dest='batch', type='int',
+                    default=1000,
+                    help='Number of messages archived per transaction.'),
+        make_option('--limit', action='store', dest='limit', type='int',
+                    help='Stop after archiving this number of messages.'),
+        )
+
+    def handle_noargs(self, age=None, batch=1000, limit=None, **options):
+        path = getattr(settings, "ARCHIVE_PATH", None)
+        if path is None:
+            raise CommandError("Missing setting ``ARCHIVE_PATH``.")
+
+        if age is None:
+            age = getattr(settings, "ARCHIVE_AGE", 90)
+
+        before = datetime.now() - timedelta(days=age)
+        count = archive(path, before, batch=batch, limit=limit)
+        if int(options.get('verbosity', 1)) > 0:
+            print "Archived %d message(s)." % count
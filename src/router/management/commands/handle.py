@@ -2,6 +2,8 @@ import os
 import pwd
 
 from django.core.management.base import BaseCommand
+from router.models import Form
+from router.models import Outgoing
 from router.transports import Message
 
 class Command(BaseCommand):
@@ -16,13 +18,14 @@ class Command(BaseCommand):
 
         transport = Message("script")
         message = transport.incoming(user, text)
-        forms = message.forms.all()
+        forms = Form.base_objects.filter(message=message).order_by('id')
         for i, form in enumerate(forms):
             print "%d/%d %s" % (i+1, len(forms), message.time.isoformat())
             print "--> %s" % form.text
             print "----" + "-"*len(form.text)
 
-            replies = form.replies.all()
+            replies = Outgoing.base_objects.filter(
+                in_reply_to=form).order_by('id')
             for j, reply in enumerate(replies):
                 print "    %d/%d %s" % (j+1, len(replies), reply.uri)
                 print "    <-- %s" % reply.text
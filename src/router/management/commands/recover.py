@@ -0,0 +1,14 @@
+from django.core.management.base import NoArgsCommand
+from router.models import Incoming
+from router.transports import Message
+from router.transports import routing_transaction
+
+class Command(NoArgsCommand):
+    help = 'Routes incoming messages which were saved but not routed ' \
+           '(run when no process is routing messages)'
+
+    def handle_noargs(self, **options):
+        for message in list(Incoming.objects.filter(
+            queued=True).order_by('id')):
+            transport = Message(message.transport or "script")
+            routing_transaction(transport.route)(message)
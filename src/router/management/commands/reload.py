@@ -0,0 +1,16 @@
+import os
+import signal
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+class Command(BaseCommand):
+    args = 'pid'
+    help = 'Reloads the routing settings of a running process'
+
+    def handle(self, pid, **options):
+        try:
+            os.kill(int(pid), signal.SIGUSR1)
+        except (ValueError, OSError), exc:
+            raise CommandError("Unable to signal process %s (%s)." % (
+                pid, exc))
@@ -0,0 +1,89 @@
+from django.core.management.base import NoArgsCommand
+from django.core.management.color import no_style
+from django.core.management.sql import custom_sql_for_model
+from django.db import connection
+from django.db import transaction
+from django.db import DatabaseError
+from django.db.models import get_apps
+from django.db.models import get_models
+
+from router.models import Incoming
+from router.models import Message
+from router.models import Outgoing
+from router.models import Pending
+from router.models import Peer
+from router import search
+
+class Command(NoArgsCommand):
+    help = 'Upgrades the database tables of an existing installation ' \
+           '(run syncdb first)'
+
+    def handle_noargs(self, **options):
+        cursor = connection.cursor()
+        self.add_columns(cursor, Message, ('transport', 'ident'))
+        self.add_columns(cursor, Peer, ('ident', ))
+        self.add_columns(cursor, Incoming, ('queued', ))
+
+        # fill in the transport and ident columns; one update per peer
+        uris = Message.base_objects.filter(transport=None).exclude(
+            peer=None).values_list('peer', flat=True).distinct()
+        for uri in list(uris):
+            transport, sep, ident = uri.partition('://')
+            Message.base_objects.filter(peer=uri).update(
+                transport=transport, ident=ident)
+
+        # fill in the ident column of peers
+        for uri in list(Peer.base_objects.filter(
+            ident=None).values_list('uri', flat=True)):
+            peer = Peer(uri=uri)
+            peer._split_uri()
+            Peer.base_objects.filter(uri=uri).update(ident=peer.ident)
+
+        # create the indexes defined in custom SQL
+        for app in get_apps():
+            for model in get_models(app):
+                for sql in custom_sql_for_model(
+                    model, no_style(), connection):
+                    if sql.strip().upper().startswith('CREATE INDEX'):
+                        self.create_index(cursor, sql)
+
+        # create and populate the search table (on SQLite)
+        search.install()
+
+        # queue unsent messages
+        unsent = Outgoing.base_objects.filter(
+            time=None, pending=None).values_list('pk', 'transport')
+        for pk, transport in list(unsent):
+            Pending(message_id=pk, transport=transport).save(
+                force_insert=True)
+
+        transaction.commit_unless_managed()
+
+    @staticmethod
+    def create_index(cursor, sql):
+        sid = transaction.savepoint()
+        try:
+            cursor.execute(sql)
+        except DatabaseError:
+            # the index already exists
+            transaction.savepoint_rollback(sid)
+        else:
+            transaction.savepoint_commit(sid)
+
+    @staticmethod
+    def add_columns(cursor, model, names):
+        qn = connection.ops.quote_name
+        table = model._meta.db_table
+        existing = [row[0] for row in connection.introspection.\
+                    get_table_description(cursor, table)]
+
+        for name in names:
+            field = model._meta.get_field(name)
+            if field.column in existing:
+                continue
+            cursor.execute("ALTER TABLE %s ADD COLUMN %s %s NULL" % (
+                qn(table), qn(field.column),
+                field.db_type(connection=connection)))
+            for sql in connection.creation.sql_indexes_for_field(
+                model, field, no_style()):
+                cursor.execute(sql)
@@ -1,6 +1,35 @@
+from datetime import datetime
+from datetime import timedelta
+
 from django.db import models
+from django.contrib.contenttypes.models import ContentType
+from polymorphic import PolymorphicManager
 from polymorphic import PolymorphicModel as Model
 
+def downcast(objects):
+    """Return ``objects`` as instances of their concrete models.
+
+    The objects are typically retrieved using the non-polymorphic
+    ``base_objects`` manager. One query is made for each concrete
+    model, skipping objects which are already instances of their
+    concrete model; the order of the objects is kept.
+    """
+
+    objects = list(objects)
+    groups = {}
+    for obj in objects:
+        groups.setdefault(obj.polymorphic_ctype_id, []).append(obj)
+
+    instances = {}
+    for ctype_id, group in groups.items():
+        model = ContentType.objects.get_for_id(ctype_id).model_class()
+        keys = [obj.pk for obj in group if type(obj) is not model]
+        if keys:
+            for obj in model.base_objects.filter(pk__in=keys):
+                instances[obj.pk] = obj
+
+    return [instances.get(obj.pk, obj) for obj in objects]
+
 class User(Model):
     """An authenticated user.
 
@@ -12,6 +41,16 @@ class User(Model):
 
     peers = ()
 
+    @property
+    def reply_uri(self):
+        """The uri of the peer to which replies are sent; looked up
+        once per instance."""
+
+        uri = self.__dict__.get('_reply_uri')
+        if uri is None:
+            uri = self.__dict__['_reply_uri'] = self.peers.all()[0].uri
+        return uri
+
 class CustomForeignKey(models.ForeignKey):
     def __init__(self, *args, **kwargs):
         self.column = kwargs.pop('column')
@@ -39,37 +78,77 @@ class Peer(Model):
 
     The transport token identifies a transport; this is configured in
     the Django settings module under the ``TRANSPORTS`` key.
+
+    The ident part of the uri (without a leading plus sign) is kept in
+    a separate (indexed) column such that a device can be looked up
+    across transports.
     """
 
     uri = models.CharField(max_length=30, primary_key=True)
     user = models.ForeignKey(User, related_name="peers", null=True)
+    ident = models.CharField(max_length=30, null=True, db_index=True)
+
+    def __init__(self, *args, **kwargs):
+        super(Peer, self).__init__(*args, **kwargs)
+        if self.ident is None:
+            self._split_uri()
+
+    def save(self, *args, **kwargs):
+        self._split_uri()
+        super(Peer, self).save(*args, **kwargs)
+
+    def _split_uri(self):
+        if self.uri:
+            self.ident = self.uri.partition('://')[2].lstrip('+')
+
+class RecentManager(PolymorphicManager):
+    """Manager which returns the most recent messages first."""
+
+    def get_query_set(self):
+        return super(RecentManager, self).get_query_set().order_by('-time')
 
 class Message(Model):
-    """SMS message between a user and the system."""
+    """SMS message between a user and the system.
+
+    The transport name and ident string of the ``uri`` are kept in
+    separate (indexed) columns.
+
+    Queries are unordered by default; use the ``recent`` manager to
+    get the most recent messages first.
+    """
 
     uri = None
     text = models.CharField(max_length=160*3)
     time = models.DateTimeField(null=True)
     peer = CustomForeignKey(
         Peer, column="uri", related_name="messages", null=True)
+    transport = models.CharField(max_length=20, null=True, db_index=True)
+    ident = models.CharField(max_length=30, null=True, db_index=True)
 
-    @property
-    def transport(self):
-        """Return transport name."""
+    objects = PolymorphicManager()
+    recent = RecentManager()
 
-        return self.uri.split('://', 1)[0]
-
-    @property
-    def ident(self):
-        """Return ident string."""
+    def __init__(self, *args, **kwargs):
+        super(Message, self).__init__(*args, **kwargs)
+        if self.transport is None:
+            self._split_uri()
 
-        return self.uri.split('://', 1)[1]
+    def save(self, *args, **kwargs):
+        self._split_uri()
+        super(Message, self).save(*args, **kwargs)
 
-    class Meta:
-        ordering = ['-time']
+    def _split_uri(self):
+        if self.uri is not None:
+            self.transport, sep, self.ident = self.uri.partition('://')
 
 class Incoming(Message):
-    """An incoming message."""
+    """An incoming message.
+
+    The ``queued`` attribute is set while the message is saved but
+    waiting to be routed by a worker thread (see ``ROUTER_WORKERS``).
+    """
+
+    queued = models.NullBooleanField(db_index=True)
 
     forms = ()
 
@@ -81,10 +160,16 @@ class Form(Model):
     erroneous = models.NullBooleanField(null=True)
 
     prompt = u""
+    keywords = ()
+    cacheable = True
 
     @property
     def user(self):
-        """Return :class:`User` object, or ``None`` if not available."""
+        """Return :class:`User` object, or ``None`` if not available.
+
+        For messages received through a transport, the user is
+        resolved when the message arrives.
+        """
 
         return self.message.peer.user
 
@@ -117,7 +202,7 @@ class Form(Model):
         if user is None:
             uri = self.message.uri
         else:
-            uri = user.peers.all()[0].uri
+            uri = user.reply_uri
 
         message = Outgoing(text=text, uri=uri, in_reply_to=self)
         message.save()
@@ -129,6 +214,23 @@ class Outgoing(Message):
     delivery_id = models.IntegerField(null=True)
     delivery = models.DateTimeField(null=True)
 
+    def __init__(self, *args, **kwargs):
+        super(Outgoing, self).__init__(*args, **kwargs)
+        self._unsent = self.time is None
+
+    def save(self, *args, **kwargs):
+        created = self.pk is None
+        super(Outgoing, self).save(*args, **kwargs)
+
+        # keep the queue of pending messages up to date
+        if self.time is None:
+            if created:
+                Pending(message=self, transport=self.transport).save(
+                    force_insert=True)
+        elif self._unsent and not created:
+            Pending.objects.filter(message=self).delete()
+        self._unsent = self.time is None
+
     @property
     def delivered(self):
         """Return ``True`` if the message was confirmed delivered."""
@@ -141,3 +243,32 @@ class Outgoing(Message):
 
         return self.time is not None
 
+
+class Pending(models.Model):
+    """Queue entry for an outgoing message which has not been sent.
+
+    Entries are added when an outgoing message is created and removed
+    when its ``time`` is set, such that transports can poll for
+    messages to send without scanning the message history.
+
+    The ``retry`` attribute is the time when the message is next due
+    to be sent; transports which poll the queue take the entries which
+    are due in this order, such that messages which fail to be sent
+    don't hold up the rest of the queue (see :meth:`postpone`).
+    """
+
+    message = models.OneToOneField(
+        Outgoing, primary_key=True, related_name="pending")
+    transport = models.CharField(max_length=20, null=True, db_index=True)
+    attempts = models.IntegerField(default=0)
+    retry = models.DateTimeField(default=datetime.now, db_index=True)
+
+    def postpone(self):
+        """Record a failed attempt to send the message. The next
+        attempt is due after one minute, doubling with each failed
+        attempt up to an hour."""
+
+        delay = min(60 * 2 ** self.attempts, 3600)
+        self.attempts += 1
+        self.retry = datetime.now() + timedelta(seconds=delay)
+        self.save()
@@ -4,6 +4,8 @@ import itertools
 from string import digits as digit_chars
 from string import ascii_letters
 
+from django.conf import settings
+
 from picoparse import choice
 from picoparse import fail
 from picoparse import many
@@ -17,6 +19,8 @@ from picoparse import run_parser
 from picoparse import satisfies
 from picoparse import sep
 from picoparse import tri
+from picoparse import local_ps
+from picoparse import BufferWalker
 from picoparse import NoMatch
 from picoparse.text import caseless_string
 from picoparse.text import lexeme
@@ -62,31 +66,126 @@ def _parse_date_format(date_format):
     except:
         fail()
 
+# number of parses which exceeded the budget, by form
+exhausted = {}
+
+class Walker(BufferWalker):
+    """Buffer walker which reads the text ``source`` in place,
+    starting at ``start``; the text is shared by all the forms which
+    parse it and is never copied. The walker fails when the input has
+    been looked at more than ``budget`` times."""
+
+    exceeded = False
+
+    def __init__(self, source, budget=None, start=0):
+        self.buffer = source
+        self.len = len(source)
+        self.offset = start
+        self.index = 0
+        self.depth = 0
+        self.budget = budget
+
+    def peek(self):
+        if self.budget is not None:
+            self.budget -= 1
+            if self.budget < 0:
+                self.exceeded = True
+                raise NoMatch()
+        position = self.offset + self.index
+        if position < self.len:
+            return self.buffer[position]
+
+    def cut(self):
+        # the consumed input is kept in the shared text
+        self.offset += self.index
+        self.index = 0
+        self.depth = 0
+
+    @property
+    def position(self):
+        """Return the position in the text of the next token."""
+
+        return self.offset + self.index
+
+def _run_parser(parser, walker):
+    old = getattr(local_ps, 'value', None)
+    local_ps.value = walker
+    try:
+        return parser()
+    finally:
+        local_ps.value = old
+
 def wrap(parser):
-    """Decorates a parser function."""
+    """Decorates a parser function.
+
+    The number of steps a parser may take is limited by the
+    ``PARSE_BUDGET`` setting (default is ``None`` which means no
+    limit); each time a parser looks at the input counts as one
+    step. A parse which exceeds the budget is treated as no match,
+    or if the ``PARSE_BUDGET_ERROR`` setting is given, as a
+    formatting error with this text. The count of such parses is
+    kept in :data:`exhausted`.
+
+    The parser reads the text in place. If an ``offset`` keyword
+    argument is given, parsing starts at this position and the
+    position where the parser stopped is returned instead of the
+    remaining text; this is how the router passes the text of a
+    message to each form without making copies.
+    """
 
-    def parse(*args):
+    def parse(*args, **kwargs):
         args = list(args)
         text = args.pop()
-        text = tuple(text) or ("", )
+        offset = kwargs.get('offset')
+
+        walker = Walker(text, getattr(settings, "PARSE_BUDGET", None),
+                        offset or 0)
         try:
-            result, remaining = run_parser(partial(parser, *args), text)
+            result = _run_parser(partial(parser, *args), walker)
         except NoMatch:
-            return None, ""
+            if walker.exceeded:
+                return _exceeded(args, text, offset)
+            return _no_match(text, offset)
         except Exception, exc: # pragma: NOCOVER
+            if walker.exceeded:
+                return _exceeded(args, text, offset)
             # backwards compatible with older version of
             # picoparse; this is equivalent to not
             # matching
             if 'Commit / cut called' in str(exc):
-                return None, ""
+                return _no_match(text, offset)
             raise
 
+        # the budget may run out inside a parser which backtracks
+        # (e.g. ``optional``) and still finishes
+        if walker.exceeded:
+            return _exceeded(args, text, offset)
+
         result = result or {}
-        return result, "".join(remaining)
+        if offset is not None:
+            return result, walker.position
+        return result, text[walker.position:]
 
     parse.__doc__ = parser.__doc__
+    parse.offsets = True
     return classmethod(parse)
 
+def _no_match(text, offset):
+    if offset is not None:
+        return None, len(text)
+    return None, ""
+
+def _exceeded(args, text, offset):
+    key = args and args[0] or None
+    exhausted[key] = exhausted.get(key, 0) + 1
+
+    error = getattr(settings, "PARSE_BUDGET_ERROR", None)
+    if error is not None:
+        from .router import FormatError
+        raise FormatError(error)
+
+    return _no_match(text, offset)
+
 def parse(parser, text):
     return "".join(run_parser(parser, tuple(text))[0])
 
@@ -1,22 +1,60 @@
-from django.dispatch import Signal
+import re
+import sys
+
+from copy import deepcopy
+from multiprocessing import Pool
+from threading import Lock
+from threading import local
+
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db import DatabaseError
 
 from django.db.models import get_model
 from django.db.models import get_models
-from django.utils.functional import memoize
+
+from .cache import LRUCache
+from .dispatch import Signal
 
 pre_handle = Signal(providing_args=["error", "result"])
 post_handle = Signal(providing_args=["error"])
 
+re_keyword = re.compile(r'(?:\w+\s*)?\+(\w*)', re.UNICODE)
+re_space = re.compile(r'\s*', re.UNICODE)
+
 class FormatError(Exception):
     """Raised inside a parser to indicate a formatting error. The
     provided ``text`` will be used as the message reply.
     """
 
     def __init__(self, text):
+        super(FormatError, self).__init__(text)
         self.text = text
 
+_workers = {}
+
+def _init_worker():
+    # the database connection belongs to the parent process
+    from django.db import connections
+    for connection in connections.all():
+        connection.connection = None
+
+def _parse_in_worker(factory, text):
+    from .pico import exhausted
+
+    router = _workers.get(factory)
+    if router is None:
+        router = _workers[factory] = factory()
+        router.processes = 0
+    consulted = set()
+    results = list(router._parse(text, consulted))
+
+    # pass back the parse budget counts to the parent process
+    counts = exhausted.copy()
+    exhausted.clear()
+    return results, counts, consulted
+
 class Sequential(object):
     """Parse messages in sequence and handles first match.
 
@@ -30,6 +68,10 @@ class Sequential(object):
 
     The application label may be omitted if there's no ambiguity.
 
+    The setting is read once per router instance; see
+    :func:`router.transports.reset_routers` to apply a new setting at
+    runtime.
+
     When using the sequential router, forms are required to provide a
     parse method:
 
@@ -43,20 +85,110 @@ class Sequential(object):
     parsing with the :mod:`picoparse` library.
 
     If there's remaining text to parse, the operation is repeated.
+    The message text is stripped once and shared by all forms; forms
+    which parse with :func:`router.pico.wrap` are given the offset
+    where parsing starts and return the position where they stopped,
+    such that the text is never copied for each form.
+
+    Forms may declare the keywords they respond to in the ``keywords``
+    attribute (e.g. ``('epi',)`` for a form that parses ``+EPI``). The
+    router keeps an index of these and only tries a form if the text
+    starts with a plus sign followed by one of its keywords (an
+    optional leading token such as a patient id is allowed). Forms
+    which declare no keywords are always tried. In all cases, forms
+    are tried in the order given in the ``FORMS`` setting.
+
+    To cache parse results, set ``PARSE_CACHE_SIZE`` to the maximum
+    number of messages to remember (the default is ``0`` which
+    disables the cache). The cache is keyed on the message text. A
+    form whose parse result depends on something other than the text
+    (e.g. the database or the current time) must opt out by setting
+    its ``cacheable`` attribute to ``False``.
+
+    Parsing is CPU-bound; to run it in a pool of worker processes
+    instead of the calling thread, set ``PARSE_PROCESSES`` to the
+    number of processes (the default is ``0`` which parses
+    inline). Only the parse results (and the counts of parses which
+    exceeded the budget, see :data:`router.pico.exhausted`) are passed
+    back; handling (and database access) always happens in the calling
+    process. Forms must not use the database while parsing when this
+    is enabled. The calling thread waits while a message is parsed,
+    so this pays off for a single message only with concurrent callers
+    (e.g. the WSGI server or ``ROUTER_WORKERS``); the messages of a
+    batch (see :meth:`route_many`) are parsed in parallel. The pool is
+    closed when the router is discarded (see
+    :func:`router.transports.reset_routers`) and terminated on hangup.
     """
 
-    _cache = {}
+    _forms = None
+    _index = None
+    _pool = None
+
+    def __init__(self):
+        size = getattr(settings, "PARSE_CACHE_SIZE", 0)
+        self.cache = LRUCache(size) if size else None
+        self.processes = getattr(settings, "PARSE_PROCESSES", 0)
+        self._pool_lock = Lock()
+        self._local = local()
 
     @property
-    def forms(self):
+    def pool(self):
+        """The worker process pool, started on first use; ``None``
+        unless ``PARSE_PROCESSES`` is set."""
+
+        if self.processes and self._pool is None:
+            self._pool_lock.acquire()
+            try:
+                if self._pool is None:
+                    from .transports import hangup
+                    self._pool = Pool(self.processes, _init_worker)
+                    hangup.connect(self.terminate)
+            finally:
+                self._pool_lock.release()
+        return self._pool
+
+    def close(self):
+        """Close the worker process pool; the workers exit when the
+        parses which are running have finished. The router parses
+        inline from then on."""
+
+        pool = self._stop()
+        if pool is not None:
+            pool.close()
+
+    def terminate(self, *args, **kwargs):
+        """Terminate the worker process pool (connected to the
+        hangup signal)."""
+
+        pool = self._stop()
+        if pool is not None:
+            pool.terminate()
+
+    def _stop(self):
+        self._pool_lock.acquire()
         try:
-            paths = getattr(settings, "FORMS")
-        except AttributeError: # pragma: NOCOVER
-            raise ImproperlyConfigured(
-                "Missing setting ``FORMS``.")
+            pool, self._pool = self._pool, None
+            self.processes = 0
+        finally:
+            self._pool_lock.release()
+        return pool
 
-        return self._get_forms(paths)
+    @property
+    def forms(self):
+        """The form models, resolved once per router from the
+        ``FORMS`` setting."""
+
+        if self._forms is None:
+            try:
+                paths = getattr(settings, "FORMS")
+            except AttributeError: # pragma: NOCOVER
+                raise ImproperlyConfigured(
+                    "Missing setting ``FORMS``.")
 
+            self._forms = self._get_forms(paths)
+        return self._forms
+
+    @staticmethod
     def _get_forms(paths):
         forms = []
         models = get_models()
@@ -78,50 +210,328 @@ class Sequential(object):
             forms.append(model)
         return forms
 
-    _get_forms = staticmethod(memoize(_get_forms, _cache, 1))
+    @property
+    def index(self):
+        if self._index is None:
+            keywords = {}
+            fallback = set()
+            for cls in self.forms:
+                names = getattr(cls, 'keywords', ())
+                if not names:
+                    fallback.add(cls)
+                for keyword in names:
+                    keywords.setdefault(keyword.lower(), set()).add(cls)
+            self._index = keywords, fallback
+        return self._index
+
+    def candidates(self, text, offset=0):
+        """Return the forms which may parse ``text`` (from ``offset``),
+        in order."""
+
+        return self._select(self.forms, text, offset)
+
+    def _select(self, forms, text, offset):
+        keywords, selected = self.index
+
+        match = re_keyword.match(text, offset)
+        if match is not None:
+            word = match.group(1).lower()
+            selected = set(selected)
+            for i in range(1, len(word) + 1):
+                selected.update(keywords.get(word[:i], ()))
+
+        return [cls for cls in forms if cls in selected]
 
     def parse(self, text):
-        """Parse the text provided in ``text``."""
+        """Parse the text provided in ``text``.
 
-        remaining = text
+        Yields tuples ``(cls, result, text, error)`` for each form
+        found in the text.
+        """
+
+        cache = self.cache
+        if cache is None:
+            return self._parse_in_pool(text)
+
+        key = text.strip()
+        results = cache.get(key)
+        if results is None:
+            # the results depend on every form which was tried, not
+            # only those which matched
+            consulted = set()
+            results = list(self._parse_in_pool(text, consulted))
+            for cls in consulted:
+                if not getattr(cls, 'cacheable', True):
+                    break
+            else:
+                cache.set(key, results)
+
+        # results may be changed by the handlers
+        return iter([(cls, deepcopy(result), text, error)
+                     for (cls, result, text, error) in results])
+
+    def parse_many(self, texts):
+        """Parse each of the texts provided in ``texts``.
+
+        Returns a list with the results of each text (see
+        :meth:`parse`). With a worker process pool, the texts are
+        parsed in parallel.
+        """
+
+        self._prefetch(texts)
+        try:
+            return [list(self.parse(text)) for text in texts]
+        finally:
+            self._local.prefetched = None
+
+    def _prefetch(self, texts):
+        pool = self.pool
+        if pool is not None and len(texts) > 1:
+            factory = type(self)
+            pending = [pool.apply_async(_parse_in_worker, (factory, text))
+                       for text in texts]
+            self._local.prefetched = zip(texts, pending)
+
+    def _parse_in_pool(self, text, consulted=None):
+        pool = self.pool
+        if pool is None:
+            return self._parse(text, consulted)
+
+        prefetched = getattr(self._local, 'prefetched', None)
+        while prefetched:
+            key, pending = prefetched.pop(0)
+            if key == text:
+                break
+        else:
+            pending = pool.apply_async(_parse_in_worker, (type(self), text))
+
+        results, counts, forms = pending.get()
+        if consulted is not None:
+            consulted.update(forms)
+        if counts:
+            from .pico import exhausted
+            for key, count in counts.items():
+                exhausted[key] = exhausted.get(key, 0) + count
+        return iter(results)
+
+    def _parse(self, text, consulted=None):
+        # the text is shared by all forms; forms wrapped with
+        # ``router.pico.wrap`` parse it in place from ``offset``;
+        # the forms which are tried are added to ``consulted``
+        source = text.strip()
+        offset = 0
 
         while True:
-            text = remaining.strip()
-            error = None
-            result = None
-            remaining = ""
+            offset = re_space.match(source, offset).end()
+            text = None
+            end = len(source)
 
-            for cls in self.forms:
+            for cls in self.candidates(source, offset):
+                if consulted is not None:
+                    consulted.add(cls)
+                error = None
+                result = None
                 try:
-                    result, remaining = cls.parse(text)
+                    if getattr(cls.parse, 'offsets', False):
+                        result, end = cls.parse(source, offset=offset)
+                    else:
+                        if text is None:
+                            text = source[offset:]
+                        result, remaining = cls.parse(text)
+                        if result is not None:
+                            if source.endswith(remaining):
+                                end = len(source) - len(remaining)
+                            else:
+                                source, end = remaining.strip(), 0
                     if result is None:
                         continue
                 except FormatError, error:
-                    pass
+                    end = len(source)
 
+                if text is None:
+                    text = source[offset:]
                 yield cls, result, text, error
                 break
 
             # stop when there's no more text to parse
-            if not remaining:
+            offset = end
+            if offset >= len(source):
                 break
 
     def route(self, message):
         """Route the message provided."""
 
-        for cls, result, text, error in self.parse(message.text):
-            erroneous = bool(error)
-            form = cls(text=text, message=message, erroneous=erroneous)
-            form.save()
+        self._route(message, self.parse(message.text))
 
-            if result is not None:
-                pre_handle.send(sender=form, result=result, error=error)
-                error = None
+    def route_many(self, messages):
+        """Route the messages provided.
+
+        The outcome is the same as routing each message in turn, but
+        all messages are parsed up front and the database changes for
+        each message are committed at once.
+
+        Returns a list of ``(message, exc_info)`` tuples for each
+        message which raised an exception during parsing or routing
+        (the remaining messages are routed regardless). A message
+        which fails to parse is not routed at all.
+        """
+
+        parsed = []
+        errors = []
+        self._prefetch([message.text for message in messages])
+        try:
+            for message in messages:
+                try:
+                    parsed.append((message, list(self.parse(message.text))))
+                except:
+                    errors.append((message, sys.exc_info()))
+        finally:
+            self._local.prefetched = None
+
+        transaction.enter_transaction_management()
+        transaction.managed(True)
+        try:
+            for message, results in parsed:
+                try:
+                    self._route(message, results)
+                except:
+                    errors.append((message, sys.exc_info()))
+
+                # keep changes made before an error, as we would
+                # outside of transaction management
                 try:
-                    form.handle(**result)
-                except Exception, error:
+                    transaction.commit()
+                except DatabaseError:
+                    transaction.rollback()
+        finally:
+            if transaction.is_dirty():
+                transaction.rollback()
+            transaction.leave_transaction_management()
+
+        return errors
+
+    def _route(self, message, results):
+        for cls, result, text, error in results:
+            # under transaction management, a failing form rolls
+            # back only its own changes; if the database doesn't
+            # support savepoints (e.g. SQLite), the savepoint calls
+            # do nothing and the changes made by the form before it
+            # failed are committed with the rest, as they would be
+            # outside of transaction management
+            if transaction.is_managed():
+                sid = transaction.savepoint()
+                try:
+                    self._handle(message, cls, result, text, error)
+                except:
+                    transaction.savepoint_rollback(sid)
                     raise
-                finally:
+                transaction.savepoint_commit(sid)
+            else:
+                self._handle(message, cls, result, text, error)
+
+    def _handle(self, message, cls, result, text, error):
+        erroneous = bool(error)
+        form = cls(text=text, message=message, erroneous=erroneous)
+        form.save()
+
+        if result is not None:
+            if pre_handle.active:
+                pre_handle.send(sender=form, result=result, error=error)
+            error = None
+            try:
+                form.handle(**result)
+            except Exception, error:
+                raise
+            finally:
+                if post_handle.active:
                     post_handle.send(sender=form, error=error)
-            elif error is not None:
-                form.reply(error.text)
+        elif error is not None:
+            form.reply(error.text)
+
+class Adaptive(Sequential):
+    """Sequential router which orders forms by match frequency.
+
+    The router counts the number of matches for each form (a
+    formatting error counts as a match) and after every
+    ``ADAPTIVE_INTERVAL`` matches (default is 100), the forms are
+    reordered such that the most frequent ones are tried first.
+
+    Forms are only ever moved past other forms which can't match the
+    same text, such that the outcome is exactly the same as with the
+    static order. A form keeps its position in the ``FORMS`` setting
+    (it is *pinned*) if it declares no keywords, if one of its
+    keywords is a prefix of a keyword of another form or if it's
+    listed in the ``PINNED_FORMS`` setting (same format as
+    ``FORMS``). The remaining forms are reordered within each run of
+    consecutive forms that are not pinned.
+
+    The match counters are available in the :attr:`hits` dictionary;
+    the current form order is available as :attr:`ordering`.
+
+    The ``PARSE_PROCESSES`` setting is ignored; the worker processes
+    would parse with the static order.
+    """
+
+    interval = 100
+
+    def __init__(self):
+        super(Adaptive, self).__init__()
+        self.interval = getattr(settings, "ADAPTIVE_INTERVAL", self.interval)
+        self.processes = 0
+        self.hits = {}
+        self.ordering = None
+        self._count = 0
+        self._lock = Lock()
+
+    def candidates(self, text, offset=0):
+        ordering = self.ordering
+        if ordering is None:
+            ordering = self.reorder()
+        return self._select(ordering, text, offset)
+
+    def parse(self, text):
+        for cls, result, text, error in super(Adaptive, self).parse(text):
+            self._lock.acquire()
+            try:
+                self.hits[cls] = self.hits.get(cls, 0) + 1
+                self._count += 1
+                if self._count % self.interval == 0:
+                    self.reorder()
+            finally:
+                self._lock.release()
+
+            yield cls, result, text, error
+
+    def reorder(self):
+        """Reorder forms by number of hits and return the new
+        ordering."""
+
+        forms = self.forms
+        pinned = set(self._get_forms(
+            tuple(getattr(settings, "PINNED_FORMS", ()))))
+        hits = dict(self.hits)
+
+        keywords = [(cls, keyword.lower()) for cls in forms
+                    for keyword in getattr(cls, 'keywords', ())]
+        for cls, keyword in keywords:
+            for other, word in keywords:
+                if other is not cls and word.startswith(keyword):
+                    pinned.add(cls)
+                    pinned.add(other)
+
+        ordering = []
+        segment = []
+        for cls in list(forms) + [None]:
+            if cls is not None and cls not in pinned and \
+                   getattr(cls, 'keywords', ()):
+                segment.append(cls)
+                continue
+
+            segment.sort(key=lambda cls: -hits.get(cls, 0))
+            ordering.extend(segment)
+            segment = []
+            if cls is not None:
+                ordering.append(cls)
+
+        self.ordering = ordering
+        return ordering
@@ -0,0 +1,133 @@
+from django.db import connections
+from django.db import transaction
+from django.db import DatabaseError
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Form
+from .models import Message
+
+TABLE = "router_message_search"
+
+# the search table for SQLite; the triggers keep it up to date
+FTS_TABLE = "CREATE VIRTUAL TABLE router_message_search USING " \
+            "fts5(text, content='router_message', content_rowid='id')"
+
+FTS_TRIGGERS = (
+    "CREATE TRIGGER router_message_search_insert AFTER INSERT ON "
+    "router_message BEGIN INSERT INTO router_message_search "
+    "(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER router_message_search_delete AFTER DELETE ON "
+    "router_message BEGIN INSERT INTO router_message_search "
+    "(router_message_search, rowid, text) VALUES "
+    "('delete', old.id, old.text); END",
+    "CREATE TRIGGER router_message_search_update AFTER UPDATE OF text "
+    "ON router_message BEGIN INSERT INTO router_message_search "
+    "(router_message_search, rowid, text) VALUES "
+    "('delete', old.id, old.text); INSERT INTO router_message_search "
+    "(rowid, text) VALUES (new.id, new.text); END",
+    )
+
+def backend():
+    """Return the name of the full-text search backend for the
+    database: ``"fts"`` for SQLite (if the search table exists),
+    ``"tsvector"`` for PostgreSQL or ``None`` if full-text search is
+    not available."""
+
+    connection = connections[DEFAULT_DB_ALIAS]
+    name = connection.settings_dict['ENGINE'].split('.')[-1]
+    if name == 'sqlite3':
+        if _has_table(connection):
+            return "fts"
+    elif name in ('postgresql_psycopg2', 'postgis'):
+        return "tsvector"
+
+def install():
+    """Create the search table and its triggers on SQLite and populate
+    the table. Nothing is created if the table exists or the SQLite
+    library does not include FTS5. Returns ``True`` if the table was
+    created.
+
+    This is called when the tables are created (``syncdb``) and by
+    the ``upgrade`` command. On PostgreSQL, the index is defined in
+    custom SQL.
+    """
+
+    connection = connections[DEFAULT_DB_ALIAS]
+    name = connection.settings_dict['ENGINE'].split('.')[-1]
+    if name != 'sqlite3' or _has_table(connection):
+        return False
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(FTS_TABLE)
+    except DatabaseError:
+        # no support for FTS5; searches use ``icontains``
+        transaction.commit_unless_managed()
+        return False
+
+    for sql in FTS_TRIGGERS:
+        cursor.execute(sql)
+    rebuild()
+    transaction.commit_unless_managed()
+    return True
+
+def search(query, queryset=None):
+    """Filter ``queryset`` (default is all messages) to the messages or
+    forms whose text matches all the words in ``query``.
+
+    The message text is indexed using the full-text search support
+    of the database (SQLite FTS5 or a PostgreSQL ``tsvector``
+    index). Forms are looked up through the index of their message
+    and then matched on their own text. If the database does not
+    support full-text search, the text is matched using ``icontains``.
+    """
+
+    if queryset is None:
+        queryset = Message.objects.all()
+
+    words = query.split()
+    if not words:
+        return queryset
+
+    name = backend()
+    model = queryset.model
+    if name is not None:
+        qn = connections[DEFAULT_DB_ALIAS].ops.quote_name
+        if issubclass(model, Form):
+            column = "%s.%s" % (qn(Form._meta.db_table), qn('message_id'))
+        else:
+            column = "%s.%s" % (qn(Message._meta.db_table), qn('id'))
+
+        if name == "fts":
+            subquery = "SELECT rowid FROM router_message_search " \
+                       "WHERE router_message_search MATCH %s"
+            param = " ".join(
+                '"%s"' % word.replace('"', '""') for word in words)
+        else:
+            subquery = "SELECT id FROM router_message WHERE " \
+                       "to_tsvector('simple', text) @@ " \
+                       "plainto_tsquery('simple', %s)"
+            param = " ".join(words)
+
+        queryset = queryset.extra(
+            where=["%s IN (%s)" % (column, subquery)], params=[param])
+        if not issubclass(model, Form):
+            return queryset
+
+    for word in words:
+        queryset = queryset.filter(text__icontains=word)
+    return queryset
+
+def rebuild():
+    """Rebuild the full-text search index from the message table."""
+
+    if backend() == "fts":
+        cursor = connections[DEFAULT_DB_ALIAS].cursor()
+        cursor.execute("INSERT INTO router_message_search "
+                       "(router_message_search) VALUES ('rebuild')")
+
+def _has_table(connection):
+    cursor = connection.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                   "AND name = %s", [TABLE])
+    return cursor.fetchone() is not None
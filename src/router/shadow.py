@@ -0,0 +1,143 @@
+import logging
+
+from collections import deque
+from Queue import Queue
+from Queue import Full
+from threading import Lock
+from threading import Thread
+from time import time as get_time
+
+from django.utils.importlib import import_module
+from django.core.exceptions import ImproperlyConfigured
+
+_stop = object()
+
+def resolve(path):
+    try:
+        module_name, class_name = path.rsplit('.', 1)
+        module = import_module(module_name)
+        return getattr(module, class_name)
+    except: # pragma: NOCOVER
+        raise ImproperlyConfigured(
+            "Unable to resolve '%s'." % path)
+
+def _summarize(results):
+    return [(cls, result, text, error and (type(error), error.text))
+            for (cls, result, text, error) in results]
+
+class Shadow(object):
+    """Compare a shadow router against the primary router.
+
+    The text of each incoming message is put on a queue (of at most
+    ``size`` items; messages are dropped when the queue is full) and
+    parsed by both routers in a background thread. Only the
+    :meth:`parse` method of each router is used, which means that
+    no forms are saved or handled.
+
+    The number of messages compared is kept in :attr:`compared` and
+    the total time spent parsing by each router in :attr:`latency`.
+    Disagreements on the resulting forms, results or errors are
+    logged and the most recent ones are kept in
+    :attr:`disagreements` as ``(text, primary, shadow)`` tuples.
+
+    The background thread is stopped by :meth:`close`; messages
+    submitted after that are dropped.
+    """
+
+    def __init__(self, primary, shadow, size=1000):
+        self.primary = resolve(primary)()
+        self.shadow = resolve(shadow)()
+        self.compared = 0
+        self.dropped = 0
+        self.latency = {'primary': 0.0, 'shadow': 0.0}
+        self.disagreements = deque(maxlen=100)
+        self.logger = logging.getLogger("router.shadow")
+        self._queue = Queue(size)
+        self._lock = Lock()
+        self._thread = None
+        self._closed = False
+
+    def submit(self, text):
+        """Queue ``text`` for comparison."""
+
+        if self._closed:
+            self.dropped += 1
+            return
+
+        if self._thread is None:
+            self._lock.acquire()
+            try:
+                if self._thread is None and not self._closed:
+                    thread = Thread(target=self.run)
+                    thread.setDaemon(True)
+                    thread.start()
+                    self._thread = thread
+            finally:
+                self._lock.release()
+
+        try:
+            self._queue.put_nowait(text)
+        except Full:
+            self.dropped += 1
+
+    def run(self):
+        while True:
+            text = self._queue.get()
+            if text is _stop:
+                break
+            try:
+                self.compare(text)
+            except Exception, exc: # pragma: NOCOVER
+                self.logger.warn("Unable to compare %s (%s)." % (
+                    repr(text), exc))
+
+    def compare(self, text):
+        """Parse ``text`` with both routers and compare the results.
+
+        Returns ``True`` if the routers agree.
+        """
+
+        primary, primary_time = self._parse(self.primary, text)
+        shadow, shadow_time = self._parse(self.shadow, text)
+
+        self.compared += 1
+        self.latency['primary'] += primary_time
+        self.latency['shadow'] += shadow_time
+
+        if primary == shadow:
+            return True
+
+        self.disagreements.append((text, primary, shadow))
+        self.logger.warn("Disagreement on %s: %s != %s." % (
+            repr(text), primary, shadow))
+        return False
+
+    def close(self):
+        """Stop the background thread after the queued messages have
+        been compared and close both routers (see
+        :meth:`router.router.Sequential.close`)."""
+
+        self._lock.acquire()
+        try:
+            self._closed = True
+            thread, self._thread = self._thread, None
+        finally:
+            self._lock.release()
+
+        if thread is not None:
+            self._queue.put(_stop)
+            thread.join()
+
+        for router in (self.primary, self.shadow):
+            close = getattr(router, 'close', None)
+            if close is not None:
+                close()
+
+    @staticmethod
+    def _parse(router, text):
+        start = get_time()
+        try:
+            results = _summarize(router.parse(text))
+        except Exception, exc:
+            results = type(exc)
+        return results, get_time() - start
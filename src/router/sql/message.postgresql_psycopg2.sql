@@ -0,0 +1 @@
+CREATE INDEX router_message_text_search ON router_message USING gin(to_tsvector('simple', text));
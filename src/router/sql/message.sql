@@ -0,0 +1 @@
+CREATE INDEX router_message_uri_time ON router_message (uri, time);
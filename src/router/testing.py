@@ -25,9 +25,12 @@ class Gateway(object):
     def receive(self, sender, text):
         self._subscribers[sender.ident] = sender
         message = self.incoming(sender.ident, text)
-        for form in message.forms.all():
-            for reply in form.replies.all():
-                self.send(reply)
+
+        from .models import Outgoing
+        replies = Outgoing.base_objects.filter(
+            in_reply_to__message=message).order_by('id')
+        for reply in replies:
+            self.send(reply)
 
     def send(self, reply):
         receiver = self._subscribers[reply.ident]
@@ -183,6 +186,10 @@ class FunctionalTestCase(UnitTestCase):  # pragma: NOCOVER
             self.tearDown()
             raise
 
+        # resolve routers with the settings of this test
+        from .transports import reset_routers
+        reset_routers()
+
     def tearDown(self):
         super(FunctionalTestCase, self).tearDown()
 
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from picoparse import any_token
 from picoparse import fail
 from picoparse import one_of
@@ -11,6 +13,8 @@ from ..pico import wrap as pico
 from ..router import FormatError
 
 class Echo(Form):
+    keywords = ('echo',)
+
     @pico
     def parse(cls):
         one_of('+')
@@ -34,6 +38,8 @@ class Empty(Form):
         self.reply(u"You sent a message with no text.")
 
 class Error(Form):
+    keywords = ('error',)
+
     @pico
     def parse(cls):
         one_of('+')
@@ -41,6 +47,8 @@ class Error(Form):
         raise FormatError("error")
 
 class Broken(Form):
+    keywords = ('break',)
+
     @pico
     def parse(cls):
         one_of('+')
@@ -49,7 +57,20 @@ class Broken(Form):
     def __init__(self, *args, **kwargs):
         raise RuntimeError("Broken")
 
+class Failing(Form):
+    keywords = ('fail',)
+
+    @pico
+    def parse(cls):
+        one_of('+')
+        caseless_string('fail')
+
+    def handle(self):
+        raise RuntimeError("Failing")
+
 class BadConfiguration(Form):
+    keywords = ('bad',)
+
     @pico
     def parse(cls):
         one_of('+')
@@ -58,6 +79,8 @@ class BadConfiguration(Form):
         raise ImproperlyConfigured("".join(remaining()))
 
 class Hello(Form):
+    keywords = ('hello',)
+
     @pico
     def parse(cls):
         one_of('+')
@@ -65,3 +88,51 @@ class Hello(Form):
 
     def handle(self):
         pass
+
+class Greeting(Form):
+    keywords = ('hello',)
+
+    @pico
+    def parse(cls):
+        one_of('+')
+        caseless_string('hello')
+        whitespace()
+        name = "".join(remaining())
+        if not name:
+            fail()
+
+        return {
+            'name': name
+            }
+
+    def handle(self, name=None):
+        self.reply(u"Hello, %s!" % name)
+
+class Clock(Form):
+    keywords = ('time',)
+    cacheable = False
+
+    @pico
+    def parse(cls):
+        one_of('+')
+        caseless_string('time')
+
+        return {
+            'time': datetime.now()
+            }
+
+    def handle(self, time=None):
+        self.reply(time.isoformat())
+
+class Holiday(Form):
+    cacheable = False
+    holiday = False
+
+    @pico
+    def parse(cls):
+        if not cls.holiday:
+            fail()
+        remaining()
+
+    def handle(self):
+        self.reply(u"Closed for the holiday.")
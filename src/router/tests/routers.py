@@ -0,0 +1,7 @@
+from router.router import Sequential
+
+class EchoOnly(Sequential):
+    @property
+    def forms(self):
+        from router.tests.models import Echo
+        return [Echo]
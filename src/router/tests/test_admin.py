@@ -0,0 +1,111 @@
+from datetime import datetime
+from datetime import timedelta
+
+from ..testing import FunctionalTestCase
+
+class ChangeListTest(FunctionalTestCase):
+    def get_changelist(self, model, **params):
+        from django.contrib import admin
+        from django.http import HttpRequest
+        from django.http import QueryDict
+        from router import admin as router_admin
+
+        request = HttpRequest()
+        request.GET = QueryDict('', mutable=True)
+        request.GET.update(params)
+
+        model_admin = admin.site._registry[model]
+        model_admin.list_per_page = 2
+        ChangeList = model_admin.get_changelist(request)
+        return ChangeList(
+            request, model, model_admin.list_display,
+            model_admin.list_display_links, model_admin.list_filter,
+            model_admin.date_hierarchy, model_admin.search_fields,
+            model_admin.list_select_related, model_admin.list_per_page,
+            model_admin.list_editable, model_admin)
+
+    @staticmethod
+    def get_key(url, name):
+        from cgi import parse_qs
+        return int(parse_qs(url[1:])[name][0])
+
+    def test_keyset_pagination(self):
+        from router.models import Incoming
+        messages = []
+        for i in range(5):
+            message = Incoming(text=u"test %d" % i, uri="test://test",
+                               time=datetime.now())
+            message.save()
+            messages.append(message)
+
+        cl = self.get_changelist(Incoming)
+        self.assertEqual(list(cl.result_list), messages[:2:-1])
+        self.assertEqual(cl.result_count, 5)
+        self.assertEqual(cl.full_result_count, 5)
+        self.assertEqual(cl.prev_url, None)
+        self.assertEqual(self.get_key(cl.next_url, "next"), messages[3].pk)
+
+        cl = self.get_changelist(Incoming, next=str(messages[3].pk))
+        self.assertEqual(list(cl.result_list), messages[2:0:-1])
+        self.assertEqual(self.get_key(cl.prev_url, "prev"), messages[2].pk)
+        self.assertEqual(self.get_key(cl.next_url, "next"), messages[1].pk)
+
+        cl = self.get_changelist(Incoming, next=str(messages[1].pk))
+        self.assertEqual(list(cl.result_list), messages[:1])
+        self.assertEqual(cl.next_url, None)
+
+        cl = self.get_changelist(Incoming, prev=str(messages[2].pk))
+        self.assertEqual(list(cl.result_list), messages[:2:-1])
+        self.assertEqual(cl.prev_url, None)
+        self.assertEqual(self.get_key(cl.next_url, "next"), messages[3].pk)
+
+    def test_date_range(self):
+        from router.models import Incoming
+        old = Incoming(text=u"old", uri="test://test",
+                       time=datetime.now() - timedelta(days=60))
+        old.save()
+        new = Incoming(text=u"new", uri="test://test", time=datetime.now())
+        new.save()
+
+        cl = self.get_changelist(Incoming)
+        self.assertEqual(list(cl.result_list), [new])
+        self.assertTrue('time__gte' in cl.params)
+
+        cl = self.get_changelist(Incoming, time__gte="2000-01-01")
+        self.assertEqual(list(cl.result_list), [new, old])
+
+    def test_search(self):
+        from router.models import Incoming
+        for text in (u"cholera", u"measles"):
+            Incoming(text=text, uri="test://test", time=datetime.now()).save()
+
+        cl = self.get_changelist(Incoming, q="cholera")
+        self.assertEqual([message.text for message in cl.result_list],
+                         [u"cholera"])
+        self.assertEqual(cl.result_count, 1)
+
+    def test_count_limit(self):
+        from router import admin
+        from router.models import Incoming
+        for i in range(5):
+            Incoming(text=u"test", uri="test://test",
+                     time=datetime.now()).save()
+
+        # without statistics, the rows are counted up to the limit
+        self.assertEqual(admin.estimate_count(Incoming), None)
+        limit = admin.COUNT_LIMIT
+        admin.COUNT_LIMIT = 3
+        try:
+            cl = self.get_changelist(Incoming)
+        finally:
+            admin.COUNT_LIMIT = limit
+        self.assertEqual(cl.result_count, 3)
+        self.assertTrue(cl.result_count_capped)
+        self.assertEqual(cl.full_result_count, u"3+")
+
+        # with statistics, the total is estimated
+        from django.db import connections
+        from django.db import DEFAULT_DB_ALIAS
+        cursor = connections[DEFAULT_DB_ALIAS].cursor()
+        cursor.execute("ANALYZE")
+        self.assertEqual(admin.estimate_count(Incoming), 5)
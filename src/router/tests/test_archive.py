@@ -0,0 +1,81 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from datetime import datetime
+
+from ..testing import FunctionalTestCase
+
+class ArchiveTest(FunctionalTestCase):
+    INSTALLED_APPS = FunctionalTestCase.INSTALLED_APPS + (
+        'router.tests',
+        )
+
+    USER_SETTINGS = {
+        'MESSAGE_ROUTER': 'router.router.Sequential',
+        'FORMS': ('Echo', ),
+        }
+
+    def setUp(self):
+        super(ArchiveTest, self).setUp()
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        super(ArchiveTest, self).tearDown()
+
+    def test_archive(self):
+        from router.tests.transports import Dummy
+        transport = Dummy("dummy")
+        old = transport.incoming(
+            "test", "+echo old", datetime(1999, 12, 31))
+        waiting = transport.incoming(
+            "test", "+echo waiting", datetime(1999, 12, 31))
+        new = transport.incoming("test", "+echo new")
+
+        from router.models import Outgoing
+        reply = Outgoing.objects.get(in_reply_to__message=old)
+        reply.time = datetime(1999, 12, 31)
+        reply.save()
+
+        from router.archive import archive
+        from router.archive import filename
+        count = archive(self.path, datetime(2000, 1, 1), batch=1)
+        self.assertEqual(count, 2)
+
+        from router.models import Form
+        from router.models import Incoming
+        from router.models import Message
+        self.assertEqual(set(Incoming.objects.all()), set([waiting, new]))
+        self.assertEqual(Form.objects.filter(message=old).count(), 0)
+        self.assertEqual(Message.objects.filter(pk=reply.pk).count(), 0)
+
+        name = filename(self.path, datetime(1999, 12, 31))
+        self.assertTrue(os.path.exists(name))
+        archive = sqlite3.connect(name)
+        try:
+            self.assertEqual(archive.execute(
+                "SELECT text FROM router_message ORDER BY id").fetchall(),
+                [(u"+echo old", ), (u"old", )])
+            self.assertEqual(archive.execute(
+                "SELECT COUNT(*) FROM tests_echo").fetchall(), [(1, )])
+        finally:
+            archive.close()
+
+    def test_command(self):
+        from router.tests.transports import Dummy
+        transport = Dummy("dummy")
+        transport.incoming("test", "+hello", datetime(1999, 12, 31))
+
+        from django.conf import settings
+        from django.core.management import call_command
+        settings.ARCHIVE_PATH = self.path
+        try:
+            call_command('archive', verbosity=0)
+        finally:
+            del settings.ARCHIVE_PATH
+
+        from router.models import Incoming
+        self.assertEqual(Incoming.objects.count(), 0)
+        self.assertEqual(os.listdir(self.path), ["messages-1999-12.db"])
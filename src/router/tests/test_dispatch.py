@@ -0,0 +1,52 @@
+from ..testing import UnitTestCase
+
+class BatchSignalTest(UnitTestCase):
+    def test_batch(self):
+        from router.dispatch import BatchSignal
+        signal = BatchSignal(size=2)
+
+        # events are dropped while there are no receivers
+        signal.add(0)
+
+        batches = []
+        def receiver(sender=None, events=None, **kwargs):
+            batches.append(events)
+        signal.connect(receiver)
+
+        self.assertTrue(signal.active)
+        signal.add(1)
+        self.assertEqual(batches, [])
+        signal.add(2)
+        self.assertEqual(batches, [[1, 2]])
+        signal.add(3)
+        signal.flush()
+        self.assertEqual(batches, [[1, 2], [3]])
+        signal.flush()
+        self.assertEqual(len(batches), 2)
+
+    def test_interval(self):
+        from time import sleep
+        from router.dispatch import BatchSignal
+        signal = BatchSignal(size=10, interval=0.1)
+
+        batches = []
+        def receiver(sender=None, events=None, **kwargs):
+            batches.append(events)
+        signal.connect(receiver)
+
+        # the batch is delivered when the interval has passed
+        signal.add(1)
+        signal.add(2)
+        self.assertEqual(batches, [])
+        sleep(0.3)
+        self.assertEqual(batches, [[1, 2]])
+
+        # a new batch starts a new interval
+        signal.add(3)
+        sleep(0.3)
+        self.assertEqual(batches, [[1, 2], [3]])
+
+    def test_inactive(self):
+        from router.dispatch import Signal
+        signal = Signal()
+        self.assertFalse(signal.active)
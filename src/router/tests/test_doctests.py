@@ -33,6 +33,11 @@ class ModuleTests(UnitTestCase):
         from router import pico
         return doctest.DocTestSuite(pico)
 
+    @classmethod
+    def test_cache(cls):
+        from router import cache
+        return doctest.DocTestSuite(cache)
+
     @classmethod
     def test_models(cls):
         from router import models
@@ -0,0 +1,94 @@
+from ..testing import UnitTestCase
+
+class ConnectionPoolTest(UnitTestCase):
+    def setUp(self):
+        from BaseHTTPServer import BaseHTTPRequestHandler
+        from BaseHTTPServer import HTTPServer
+        from threading import Thread
+        import time
+
+        self.connections = connections = []
+        self.requests = requests = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                connections.append(self.client_address)
+
+            def do_GET(self):
+                requests.append(self.path)
+                if self.path == "/slow":
+                    time.sleep(0.5)
+                body = self.path
+                self.send_response(self.path == "/missing" and 404 or 202)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.server.handle_error = lambda *args: None
+        thread = Thread(target=self.server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        self.url = "http://127.0.0.1:%d" % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keep_alive(self):
+        from urllib2 import Request
+        from router.http import ConnectionPool
+        pool = ConnectionPool(size=1)
+        for i in range(3):
+            response = pool.urlopen(Request(self.url + "/send?i=%d" % i))
+            self.assertEqual(response.code, 202)
+            self.assertEqual(response.read(), "/send?i=%d" % i)
+        self.assertEqual(len(self.connections), 1)
+
+        response = pool.urlopen(Request(self.url + "/missing"))
+        self.assertEqual(response.code, 404)
+        pool.close()
+
+    def test_idle_timeout(self):
+        from urllib2 import Request
+        from router.http import ConnectionPool
+        pool = ConnectionPool(size=1, idle_timeout=-1)
+        for i in range(2):
+            pool.urlopen(Request(self.url))
+        self.assertEqual(len(self.connections), 2)
+        pool.close()
+
+    def test_stale_connection(self):
+        from urllib2 import Request
+        from router.http import ConnectionPool
+        pool = ConnectionPool(size=1)
+        pool.urlopen(Request(self.url))
+        for connections in pool._idle.values():
+            for connection, time in connections:
+                connection.sock.shutdown(2)
+
+        response = pool.urlopen(Request(self.url))
+        self.assertEqual(response.code, 202)
+        self.assertEqual(len(self.connections), 2)
+        pool.close()
+
+    def test_timeout(self):
+        from urllib2 import Request
+        from urllib2 import URLError
+        from router.http import ConnectionPool
+        pool = ConnectionPool(size=1)
+        pool.urlopen(Request(self.url))
+        self.assertRaises(URLError, pool.urlopen,
+                          Request(self.url + "/slow"), timeout=0.1)
+
+        # the request is not sent again
+        import time
+        time.sleep(1.0)
+        self.assertEqual(self.requests, ["/", "/slow"])
+        pool.close()
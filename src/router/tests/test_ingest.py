@@ -0,0 +1,43 @@
+from ..testing import UnitTestCase
+
+class IngestTest(UnitTestCase):
+    def test_route(self):
+        from router.ingest import Ingest
+
+        routed = []
+        def route(message):
+            if message is None:
+                raise ValueError(message)
+            routed.append(message)
+
+        ingest = Ingest(route, workers=2, size=1)
+        for i in range(10):
+            ingest.put(i)
+        ingest.put(None)
+        ingest.put(10)
+        ingest.join()
+        self.assertEqual(sorted(routed), range(11))
+
+        threads = list(ingest._threads)
+        self.assertEqual(len(threads), 2)
+        ingest.stop()
+        for thread in threads:
+            self.assertFalse(thread.isAlive())
+
+        # no new workers are started once stopped
+        self.assertRaises(RuntimeError, ingest.put, 11)
+        self.assertEqual(ingest._threads, [])
+
+    def test_batch(self):
+        from router.ingest import Ingest
+
+        batches = []
+        ingest = Ingest(batches.append, size=10, batch=3)
+        for i in range(7):
+            ingest._queue.put(i)
+        ingest.put(7)
+        ingest.join()
+        self.assertEqual(sum(batches, []), range(8))
+        self.assertTrue(max(map(len, batches)) <= 3)
+        self.assertTrue(len(batches) < 8)
+        ingest.stop()
@@ -10,6 +10,137 @@ class PolymorphicTest(FunctionalTestCase):
         self.failIf(message is None)
         self.failUnless(isinstance(message, models.Incoming))
 
+class TransportColumnTest(FunctionalTestCase):
+    def test_filter(self):
+        from router.models import Peer
+        from router.models import Outgoing
+        Peer(uri="foo://bar").save()
+        message = Outgoing(text=u"test")
+        message.peer = Peer.objects.get()
+        message.save()
+        self.assertEqual(Outgoing.objects.get(transport="foo"), message)
+        self.assertEqual(Outgoing.objects.get(ident="bar"), message)
+
+    def test_upgrade(self):
+        from router.models import Message
+        from router.models import Outgoing
+        Outgoing(text=u"test", uri="foo://bar").save()
+        Message.base_objects.update(transport=None, ident=None)
+
+        from django.core.management import call_command
+        call_command('upgrade')
+
+        message = Message.base_objects.get()
+        self.assertEqual(message.transport, "foo")
+        self.assertEqual(message.ident, "bar")
+
+    def test_upgrade_peer_ident(self):
+        from router.models import Peer
+        Peer(uri="gsm://+256").save()
+        Peer(uri="gsm://123").save()
+        Peer.base_objects.update(ident=None)
+
+        from django.core.management import call_command
+        call_command('upgrade')
+        self.assertEqual(
+            sorted(Peer.base_objects.values_list('ident', flat=True)),
+            ["123", "256"])
+
+    def test_upgrade_pending(self):
+        from router.models import Outgoing
+        from router.models import Pending
+        message = Outgoing(text=u"test", uri="foo://bar")
+        message.save()
+        Pending.objects.all().delete()
+
+        from django.core.management import call_command
+        call_command('upgrade')
+        self.assertEqual(Pending.objects.get().message, message)
+
+class PendingTest(FunctionalTestCase):
+    def test_queue(self):
+        from router.models import Outgoing
+        from router.models import Pending
+        message = Outgoing(text=u"test", uri="foo://bar")
+        message.save()
+        self.assertEqual(Pending.objects.get().transport, "foo")
+        self.assertEqual(list(Outgoing.objects.filter(
+            pending__transport="foo")), [message])
+
+        # saving an unsent message leaves it in the queue
+        message.text = u"changed"
+        message.save()
+        self.assertEqual(Pending.objects.count(), 1)
+
+        from datetime import datetime
+        message = Outgoing.objects.get()
+        message.time = datetime.now()
+        message.save()
+        self.assertEqual(Pending.objects.count(), 0)
+
+    def test_postpone(self):
+        from router.models import Outgoing
+        from router.models import Pending
+        failing = Outgoing(text=u"test", uri="foo://bar")
+        failing.save()
+        message = Outgoing(text=u"test", uri="foo://baz")
+        message.save()
+
+        # a message which fails is retried after the others
+        entry = Pending.objects.get(message=failing)
+        entry.postpone()
+        self.assertEqual(entry.attempts, 1)
+        self.assertEqual(list(Pending.objects.order_by('retry').values_list(
+            'message', flat=True)), [message.pk, failing.pk])
+
+        from datetime import datetime
+        self.assertEqual(list(Pending.objects.filter(
+            retry__lte=datetime.now()).values_list(
+            'message', flat=True)), [message.pk])
+
+        # the delay doubles with each attempt
+        first = entry.retry
+        entry.postpone()
+        self.assertTrue((entry.retry - first).seconds >= 60)
+
+class OrderingTest(FunctionalTestCase):
+    def test_unordered(self):
+        from router.models import Incoming
+        self.assertFalse('ORDER BY' in str(Incoming.objects.all().query))
+
+    def test_recent(self):
+        from datetime import datetime
+        from router.models import Incoming
+        for day in (1, 3, 2):
+            Incoming(text=u"test", time=datetime(1999, 12, day)).save()
+        self.assertEqual([message.time.day for message in
+                          Incoming.recent.all()], [3, 2, 1])
+
+class DowncastTest(FunctionalTestCase):
+    INSTALLED_APPS = FunctionalTestCase.INSTALLED_APPS + (
+        'router.tests',
+        )
+
+    def test_downcast(self):
+        from router.models import Incoming
+        from router.tests.models import Echo
+        from router.tests.models import Hello
+        message = Incoming(text=u"test", uri="test://test")
+        message.save()
+        for cls in (Echo, Hello, Echo):
+            cls(text=u"test", message=message).save()
+
+        from router.models import Form
+        from router.models import downcast
+        from django.db import connection
+        forms = list(Form.base_objects.order_by('id'))
+        del connection.queries[:]
+        forms = downcast(forms)
+        self.assertEqual([type(form) for form in forms], [Echo, Hello, Echo])
+        self.assertEqual(len(connection.queries), 2)
+        self.assertEqual(downcast(forms), forms)
+        self.assertEqual(len(connection.queries), 2)
+
 class MessageTest(UnitTestCase):
     def test_ident(self):
         from router.models import Message
@@ -30,3 +161,17 @@ class FormTest(UnitTestCase):
         from router.models import Form
         form = Form(message=message)
         self.assertEqual(form.user, None)
+
+class UserTest(FunctionalTestCase):
+    def test_reply_uri(self):
+        from router.models import Peer
+        from router.models import User
+        user = User()
+        user.save()
+        Peer(uri="test://test", user=user).save()
+
+        from django.db import connection
+        self.assertEqual(user.reply_uri, "test://test")
+        del connection.queries[:]
+        self.assertEqual(user.reply_uri, "test://test")
+        self.assertEqual(connection.queries, [])
@@ -0,0 +1,70 @@
+from ..testing import UnitTestCase
+
+class BudgetTest(UnitTestCase):
+    def setUp(self):
+        super(BudgetTest, self).setUp()
+        from django.conf import settings
+        settings.PARSE_BUDGET = 100
+
+    def tearDown(self):
+        from django.conf import settings
+        del settings.PARSE_BUDGET
+        super(BudgetTest, self).tearDown()
+
+    def test_within_budget(self):
+        from router.tests.models import Echo
+        self.assertEqual(Echo.parse("+echo test"), ({'echo': 'test'}, ''))
+
+    def test_exceeded(self):
+        from router import pico
+        from router.tests.models import Echo
+        count = pico.exhausted.get(Echo, 0)
+        self.assertEqual(Echo.parse("+echo " + "x" * 100), (None, ""))
+        self.assertEqual(pico.exhausted[Echo], count + 1)
+
+    def test_exceeded_optional(self):
+        from picoparse import any_token
+        from picoparse import many1
+        from picoparse import one_of
+        from picoparse import optional
+        from picoparse import partial
+        from picoparse import tri
+        from router import pico
+
+        class Form(object):
+            @pico.wrap
+            def parse(cls):
+                one_of('+')
+                optional(tri(partial(many1, any_token)), None)
+
+        # the budget runs out inside ``tri`` which backtracks
+        self.assertEqual(Form.parse("+" + "x" * 100), (None, ""))
+        self.assertEqual(pico.exhausted[Form], 1)
+
+    def test_exceeded_error(self):
+        from django.conf import settings
+        from router.router import FormatError
+        from router.tests.models import Echo
+
+        settings.PARSE_BUDGET_ERROR = "Message too long."
+        try:
+            self.assertRaises(FormatError, Echo.parse, "+echo " + "x" * 100)
+        finally:
+            del settings.PARSE_BUDGET_ERROR
+
+class WrapTest(UnitTestCase):
+    def test_remaining(self):
+        from router.tests.models import Hello
+        self.assertEqual(Hello.parse(u"+hello +hello"), ({}, u" +hello"))
+        self.assertEqual(Hello.parse(u"+hello"), ({}, u""))
+
+    def test_offset(self):
+        from router.tests.models import Hello
+        text = u"+echo test +hello +hello"
+        self.assertEqual(Hello.parse(text, offset=11), ({}, 17))
+        self.assertEqual(Hello.parse(text, offset=18), ({}, 24))
+        self.assertEqual(Hello.parse(text, offset=0), (None, 24))
+
+    def test_empty(self):
+        from router.tests.models import Empty
+        self.assertEqual(Empty.parse(u""), ({}, u""))
@@ -74,3 +74,257 @@ class SequentialRouterTest(FunctionalTestCase):
 
         self.assertEqual(len(parsed), 2)
 
+    def test_route_many(self):
+        from router.router import Sequential
+        from router.models import Incoming
+
+        messages = []
+        for text in ("+echo test", "+error", "+hello +hello"):
+            message = Incoming(text=text)
+            message.save()
+            messages.append(message)
+
+        router = Sequential()
+        errors = router.route_many(messages)
+        self.assertEqual(errors, [])
+
+        first, second, third = messages
+        self.assertEqual(first.forms.get().replies.get().text, "test")
+        self.assertEqual(second.forms.get().erroneous, True)
+        self.assertEqual(second.forms.get().replies.get().text, "error")
+        self.assertEqual(third.forms.count(), 2)
+
+class KeywordIndexTest(FunctionalTestCase):
+    INSTALLED_APPS = FunctionalTestCase.INSTALLED_APPS + (
+        'router.tests',
+        )
+
+    USER_SETTINGS = {
+        'FORMS': ('Echo', 'Empty', 'Hello'),
+        }
+
+    def test_candidates(self):
+        from router.router import Sequential
+        from router.tests.models import Echo, Empty, Hello
+
+        router = Sequential()
+        self.assertEqual(router.candidates("+hello"), [Empty, Hello])
+        self.assertEqual(router.candidates("+ECHO test"), [Echo, Empty])
+        self.assertEqual(router.candidates("abc1 +echo"), [Echo, Empty])
+        self.assertEqual(router.candidates("hello"), [Empty])
+
+    def test_parse(self):
+        from router.router import Sequential
+        from router.tests.models import Echo, Hello
+
+        router = Sequential()
+        forms = [cls for (cls, result, text, error)
+                 in router.parse("+hello +echo test")]
+        self.assertEqual(forms, [Hello, Echo])
+
+class AdaptiveRouterTest(FunctionalTestCase):
+    INSTALLED_APPS = FunctionalTestCase.INSTALLED_APPS + (
+        'router.tests',
+        )
+
+    USER_SETTINGS = {
+        'FORMS': ('Greeting', 'Hello', 'Echo', 'Error', 'Empty'),
+        'ADAPTIVE_INTERVAL': 2,
+        }
+
+    def test_reorder(self):
+        from router.router import Adaptive
+        from router.tests.models import Echo, Error, Empty, Greeting, Hello
+
+        router = Adaptive()
+        self.assertEqual(router.candidates("+error"), [Error, Empty])
+        self.assertEqual(
+            router.ordering, [Greeting, Hello, Echo, Error, Empty])
+
+        list(router.parse("+error"))
+        list(router.parse("+error"))
+        self.assertEqual(router.hits, {Error: 2})
+        self.assertEqual(
+            router.ordering, [Greeting, Hello, Error, Echo, Empty])
+
+    def test_shared_keyword(self):
+        from router.router import Adaptive
+        from router.tests.models import Echo, Error, Empty, Greeting, Hello
+
+        router = Adaptive()
+        for i in range(4):
+            self.assertEqual([cls for (cls, result, text, error)
+                              in router.parse("+hello")], [Hello])
+        self.assertEqual(router.hits, {Hello: 4})
+
+        # forms which compete for the same text keep their position,
+        # such that the outcome is the same as with the static order
+        self.assertEqual(
+            router.ordering, [Greeting, Hello, Echo, Error, Empty])
+        self.assertEqual(
+            router.candidates("+hello you"), [Greeting, Hello, Empty])
+        self.assertEqual([(cls, result) for (cls, result, text, error)
+                          in router.parse("+hello you")], [
+            (Greeting, {'name': 'you'})])
+
+    def test_pinned(self):
+        from router.router import Adaptive
+        from router.tests.models import Echo, Error, Empty, Greeting, Hello
+
+        from django.conf import settings
+        settings.PINNED_FORMS = ('Error', )
+        try:
+            router = Adaptive()
+            list(router.parse("+error"))
+            list(router.parse("+error"))
+        finally:
+            del settings.PINNED_FORMS
+
+        self.assertEqual(
+            router.ordering, [Greeting, Hello, Echo, Error, Empty])
+
+    def test_parse_processes(self):
+        from django.conf import settings
+        from router.router import Adaptive
+
+        settings.PARSE_PROCESSES = 1
+        try:
+            router = Adaptive()
+        finally:
+            del settings.PARSE_PROCESSES
+
+        self.assertEqual(router.pool, None)
+
+class ParseCacheTest(FunctionalTestCase):
+    INSTALLED_APPS = FunctionalTestCase.INSTALLED_APPS + (
+        'router.tests',
+        )
+
+    USER_SETTINGS = {
+        'FORMS': ('Echo', 'Clock', 'Holiday'),
+        'PARSE_CACHE_SIZE': 1,
+        }
+
+    def test_cache(self):
+        from router.router import Sequential
+        from router.tests.models import Echo
+
+        router = Sequential()
+        results = list(router.parse("+echo test"))
+        self.assertEqual(len(router.cache), 1)
+        self.assertEqual(results, [(Echo, {'echo': 'test'}, '+echo test', None)])
+
+        # results are copied on every hit
+        results[0][1]['echo'] = 'changed'
+        self.assertEqual(list(router.parse(" +echo test")), [
+            (Echo, {'echo': 'test'}, '+echo test', None)])
+
+        # least recently used message is evicted
+        list(router.parse("+echo other"))
+        self.assertEqual(len(router.cache), 1)
+        self.assertEqual(router.cache.get("+echo test"), None)
+
+    def test_not_cacheable(self):
+        from router.router import Sequential
+
+        router = Sequential()
+        list(router.parse("+time"))
+        self.assertEqual(len(router.cache), 0)
+
+    def test_not_cacheable_no_match(self):
+        from router.router import Sequential
+        from router.tests.models import Holiday
+
+        # the form declines, but may match the same text later
+        router = Sequential()
+        self.assertEqual(list(router.parse("hello")), [])
+        self.assertEqual(len(router.cache), 0)
+
+        Holiday.holiday = True
+        try:
+            self.assertEqual([cls for (cls, result, text, error)
+                              in router.parse("hello")], [Holiday])
+        finally:
+            Holiday.holiday = False
+
+class ProcessPoolTest(FunctionalTestCase):
+    INSTALLED_APPS = FunctionalTestCase.INSTALLED_APPS + (
+        'router.tests',
+        )
+
+    USER_SETTINGS = {
+        'FORMS': ('Echo', 'Error'),
+        'PARSE_PROCESSES': 1,
+        }
+
+    def test_parse(self):
+        from router.router import Sequential
+        from router.tests.models import Echo
+
+        router = Sequential()
+        try:
+            self.assertEqual(list(router.parse("+echo test")), [
+                (Echo, {'echo': 'test'}, '+echo test', None)])
+            self.assertNotEqual(router.pool, None)
+        finally:
+            router.pool.terminate()
+
+    def test_format_error(self):
+        from router.router import Sequential
+        from router.router import FormatError
+        from router.tests.models import Error
+
+        router = Sequential()
+        try:
+            [(cls, result, text, error)] = router.parse("+error")
+        finally:
+            router.pool.terminate()
+        self.assertEqual(cls, Error)
+        self.assertTrue(isinstance(error, FormatError))
+        self.assertEqual(error.text, "error")
+
+    def test_parse_many(self):
+        from router.router import Sequential
+        from router.tests.models import Echo, Error
+
+        router = Sequential()
+        try:
+            results = router.parse_many(["+echo a", "+error", "+echo b"])
+        finally:
+            router.terminate()
+        self.assertEqual([[(cls, result) for (cls, result, text, error)
+                           in items] for items in results], [
+            [(Echo, {'echo': 'a'})], [(Error, None)], [(Echo, {'echo': 'b'})]])
+
+    def test_exhausted(self):
+        from django.conf import settings
+        from router import pico
+        from router.router import Sequential
+        from router.tests.models import Echo
+
+        settings.PARSE_BUDGET = 100
+        router = Sequential()
+        try:
+            count = pico.exhausted.get(Echo, 0)
+            self.assertEqual(list(router.parse("+echo " + "x" * 100)), [])
+            self.assertEqual(pico.exhausted[Echo], count + 1)
+        finally:
+            router.terminate()
+            del settings.PARSE_BUDGET
+
+    def test_reset_routers(self):
+        from router.transports import Message
+        from router.transports import reset_routers
+        from router.tests.models import Echo
+
+        router = Message._get_router('router.router.Sequential')
+        pool = router.pool
+        self.assertNotEqual(pool, None)
+
+        reset_routers()
+        self.assertEqual(router.pool, None)
+        self.assertRaises(AssertionError, pool.apply, len, ((), ))
+
+        # the router parses inline from then on
+        self.assertEqual([cls for (cls, result, text, error)
+                          in router.parse("+echo test")], [Echo])
@@ -0,0 +1,84 @@
+from ..testing import FunctionalTestCase
+
+class SearchTest(FunctionalTestCase):
+    INSTALLED_APPS = FunctionalTestCase.INSTALLED_APPS + (
+        'router.tests',
+        )
+
+    USER_SETTINGS = {
+        'MESSAGE_ROUTER': 'router.router.Sequential',
+        'FORMS': ('Echo', ),
+        }
+
+    def test_search(self):
+        from router.models import Outgoing
+        from router.search import search
+        cholera = Outgoing(text=u"Cholera cases: 5", uri="test://1")
+        cholera.save()
+        measles = Outgoing(text=u"Measles and cholera", uri="test://2")
+        measles.save()
+
+        self.assertEqual(set(search(u"cholera")), set([cholera, measles]))
+        self.assertEqual(list(search(u"measles cholera")), [measles])
+        self.assertEqual(list(search(u'"cases:')), [cholera])
+        self.assertEqual(list(search(u"cholera", Outgoing.objects.filter(
+            ident="1"))), [cholera])
+
+        # the index follows updates and deletes
+        cholera.text = u"Malaria"
+        cholera.save()
+        self.assertEqual(list(search(u"cholera")), [measles])
+        self.assertEqual(list(search(u"malaria")), [cholera])
+        measles.delete()
+        self.assertEqual(list(search(u"cholera")), [])
+
+    def test_forms(self):
+        from router.tests.transports import Dummy
+        transport = Dummy("dummy")
+        transport.incoming("test", "+echo cholera")
+        transport.incoming("test", "+echo measles")
+
+        from router.models import Form
+        from router.search import search
+        self.assertEqual([form.message.text for form in search(
+            u"cholera", Form.objects.all())], [u"+echo cholera"])
+
+    def test_upgrade(self):
+        from router.models import Outgoing
+        from router.search import search
+        message = Outgoing(text=u"Cholera", uri="test://1")
+        message.save()
+
+        from django.db import connections
+        from django.db import DEFAULT_DB_ALIAS
+        cursor = connections[DEFAULT_DB_ALIAS].cursor()
+        cursor.execute("DROP TABLE router_message_search")
+        for name in ("insert", "delete", "update"):
+            cursor.execute("DROP TRIGGER router_message_search_%s" % name)
+
+        from django.core.management import call_command
+        call_command('upgrade')
+        self.assertEqual(list(search(u"cholera")), [message])
+
+    def test_without_fts(self):
+        from django.db import connections
+        from django.db import DEFAULT_DB_ALIAS
+        cursor = connections[DEFAULT_DB_ALIAS].cursor()
+        cursor.execute("DROP TABLE router_message_search")
+        for name in ("insert", "delete", "update"):
+            cursor.execute("DROP TRIGGER router_message_search_%s" % name)
+
+        # the SQLite library does not support the search table
+        from router import search
+        statement = search.FTS_TABLE
+        search.FTS_TABLE = statement.replace("fts5", "no_such_module")
+        try:
+            self.assertFalse(search.install())
+        finally:
+            search.FTS_TABLE = statement
+        self.assertEqual(search.backend(), None)
+
+        from router.models import Outgoing
+        message = Outgoing(text=u"Cholera", uri="test://1")
+        message.save()
+        self.assertEqual(list(search.search(u"cholera")), [message])
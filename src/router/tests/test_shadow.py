@@ -0,0 +1,47 @@
+from ..testing import FunctionalTestCase
+
+class ShadowTest(FunctionalTestCase):
+    INSTALLED_APPS = FunctionalTestCase.INSTALLED_APPS + (
+        'router.tests',
+        )
+
+    USER_SETTINGS = {
+        'FORMS': ('Echo', 'Error', 'Hello'),
+        }
+
+    def _make_shadow(self, path):
+        from router.shadow import Shadow
+        return Shadow('router.router.Sequential', path)
+
+    def test_agreement(self):
+        shadow = self._make_shadow('router.router.Adaptive')
+        self.assertTrue(shadow.compare("+echo test"))
+        self.assertTrue(shadow.compare("+error"))
+        self.assertEqual(shadow.compared, 2)
+        self.assertEqual(len(shadow.disagreements), 0)
+
+    def test_disagreement(self):
+        shadow = self._make_shadow('router.tests.routers.EchoOnly')
+        self.assertTrue(shadow.compare("+echo test"))
+        self.assertFalse(shadow.compare("+hello"))
+
+        text, primary, secondary = shadow.disagreements[0]
+        self.assertEqual(text, "+hello")
+        self.assertEqual(len(primary), 1)
+        self.assertEqual(secondary, [])
+        self.assertTrue(shadow.latency['shadow'] >= 0)
+
+    def test_close(self):
+        shadow = self._make_shadow('router.router.Adaptive')
+        shadow.submit("+echo test")
+        thread = shadow._thread
+        self.assertTrue(thread.isAlive())
+
+        shadow.close()
+        self.assertFalse(thread.isAlive())
+        self.assertEqual(shadow.compared, 1)
+
+        # messages are dropped once the shadow router is closed
+        shadow.submit("+echo test")
+        self.assertEqual(shadow._thread, None)
+        self.assertEqual(shadow.dropped, 1)
@@ -4,6 +4,7 @@ import time
 import urllib
 
 from ..testing import FunctionalTestCase
+from ..testing import UnitTestCase
 
 class MessageTest(FunctionalTestCase):
     INSTALLED_APPS = FunctionalTestCase.INSTALLED_APPS + (
@@ -16,6 +17,7 @@ class MessageTest(FunctionalTestCase):
             'BadConfiguration',
             'Broken',
             'Echo',
+            'Failing',
             )
         }
     
@@ -36,6 +38,41 @@ class MessageTest(FunctionalTestCase):
         finally:
             settings.DEBUG = True
 
+    def test_routing_transaction(self):
+        from router.tests.transports import Dummy
+        transport = Dummy("dummy")
+
+        from django.conf import settings
+        try:
+            settings.DEBUG = False
+            settings.ROUTING_TRANSACTION = True
+            import warnings
+            with warnings.catch_warnings(record=True) as w:
+                warnings.simplefilter("always")
+                transport.incoming("test", "+echo test")
+                transport.incoming("test", "+fail")
+
+            self.assertEqual(len(w), 1)
+            self.assertTrue('RuntimeError' in str(w[0]))
+        finally:
+            settings.DEBUG = True
+            del settings.ROUTING_TRANSACTION
+
+        from django.db import transaction
+        self.assertFalse(transaction.is_managed())
+
+        from router.models import Incoming
+        first, second = Incoming.objects.order_by('id')
+        self.assertEqual(first.forms.get().replies.get().text, "test")
+
+        # the failing form is rolled back to its savepoint; without
+        # savepoints (e.g. SQLite), it's committed with the rest
+        from django.db import connection
+        if connection.features.uses_savepoints:
+            self.assertEqual(second.forms.count(), 0)
+        else:
+            self.assertEqual(second.forms.count(), 1)
+
     def test_configuration_error(self):
         from router.tests.transports import Dummy
         transport = Dummy("dummy")
@@ -53,6 +90,62 @@ class MessageTest(FunctionalTestCase):
         finally:
             settings.DEBUG = True
 
+    def test_incoming_many(self):
+        from router.tests.transports import Dummy
+        transport = Dummy("dummy")
+
+        from django.conf import settings
+        try:
+            settings.DEBUG = False
+            import warnings
+            with warnings.catch_warnings(record=True) as w:
+                warnings.simplefilter("always")
+                messages = transport.incoming_many([
+                    ("test", "+echo first", None),
+                    ("test", "+break", None),
+                    ("other", "+echo second", None),
+                    ])
+
+            self.assertEqual(len(w), 1)
+            self.assertTrue('RuntimeError' in str(w[0]))
+        finally:
+            settings.DEBUG = True
+
+        from router.models import Peer
+        self.assertEqual(Peer.objects.count(), 2)
+
+        first, second, third = messages
+        self.assertEqual(first.forms.get().replies.get().text, "first")
+        self.assertEqual(third.forms.get().replies.get().text, "second")
+        self.assertEqual(third.uri, "dummy://other")
+
+    def test_incoming_many_parse_error(self):
+        from router.tests.transports import Dummy
+        transport = Dummy("dummy")
+
+        from django.conf import settings
+        try:
+            settings.DEBUG = False
+            import warnings
+            with warnings.catch_warnings(record=True) as w:
+                warnings.simplefilter("always")
+                messages = transport.incoming_many([
+                    ("test", "+echo first", None),
+                    ("test", "+bad parser", None),
+                    ("test", "+echo second", None),
+                    ])
+
+            self.assertEqual(len(w), 1)
+            self.assertTrue('ImproperlyConfigured' in str(w[0]))
+        finally:
+            settings.DEBUG = True
+
+        # the other messages are routed regardless
+        first, second, third = messages
+        self.assertEqual(first.forms.get().replies.get().text, "first")
+        self.assertEqual(second.forms.count(), 0)
+        self.assertEqual(third.forms.get().replies.get().text, "second")
+
     def test_signals(self):
         from router.transports import pre_route
         from router.transports import post_route
@@ -77,12 +170,188 @@ class MessageTest(FunctionalTestCase):
         self.assertTrue(len(s1), 1)
         self.assertTrue(len(s2), 1)
 
+    def test_routed(self):
+        from router.transports import routed
+
+        batches = []
+        def receiver(sender=None, events=None, **kwargs):
+            batches.append(events)
+        routed.connect(receiver)
+
+        try:
+            from router.tests.transports import Dummy
+            transport = Dummy("dummy")
+            first = transport.incoming("test", "+echo first")
+            second = transport.incoming("test", "+echo second")
+            routed.flush()
+        finally:
+            routed.disconnect(receiver)
+
+        self.assertEqual(batches, [[first, second]])
+
+    def test_peer_cache(self):
+        from router.tests.transports import Dummy
+        transport = Dummy("dummy")
+
+        from django.conf import settings
+        from django.db import connection
+        settings.PEER_CACHE_SIZE = 10
+        try:
+            transport.incoming("test", "+echo first")
+            del connection.queries[:]
+            message = transport.incoming("test", "+echo second")
+            self.assertEqual([query for query in connection.queries
+                              if 'router_peer' in query['sql']], [])
+            self.assertEqual(message.peer.user_id, None)
+
+            # the cache entry is discarded when the peer changes
+            from router.models import Peer
+            from router.models import User
+            user = User()
+            user.save()
+            peer = Peer.objects.get(uri="dummy://test")
+            peer.user = user
+            peer.save()
+            message = transport.incoming("test", "+echo third")
+            self.assertEqual(message.peer.user_id, user.id)
+
+            user.delete()
+            message = transport.incoming("test", "+echo fourth")
+            self.assertEqual(message.peer.user_id, None)
+        finally:
+            del settings.PEER_CACHE_SIZE
+
+    def test_peer_cache_after_commit(self):
+        from router.tests.transports import Dummy
+        from router.transports import routing_transaction
+        transport = Dummy("dummy")
+
+        from router.models import User
+        user = User()
+        user.save()
+
+        from django.conf import settings
+        settings.PEER_CACHE_SIZE = 10
+        settings.ROUTING_TRANSACTION = True
+        try:
+            users = transport.users
+
+            @routing_transaction
+            def update():
+                user.save()
+                # a routing worker caches the row before the commit
+                users.set(user.pk, User())
+
+            update()
+            self.assertEqual(users.get(user.pk), None)
+        finally:
+            del settings.PEER_CACHE_SIZE
+            del settings.ROUTING_TRANSACTION
+
+    def test_cache_signals(self):
+        from django.db.models import signals
+        from django.dispatch.dispatcher import _make_id
+        from router.models import Incoming
+        from router.models import User
+        from router.transports import invalidate_user
+
+        # only saving a user invalidates the cached users
+        self.assertFalse(invalidate_user in signals.post_save.\
+                         _live_receivers(_make_id(Incoming)))
+        self.assertTrue(invalidate_user in signals.post_save.\
+                        _live_receivers(_make_id(User)))
+
+    def test_user_resolution(self):
+        from router.tests.transports import Dummy
+        transport = Dummy("dummy")
+
+        from router.models import Peer
+        from router.models import User
+        user = User()
+        user.save()
+        Peer(uri="dummy://test", user=user).save()
+
+        from django.conf import settings
+        from django.db import connection
+        settings.PEER_CACHE_SIZE = 10
+        try:
+            transport.incoming("test", "+echo first")
+            del connection.queries[:]
+            message = transport.incoming("test", "+echo second")
+            self.assertEqual(message.peer.user, user)
+            self.assertEqual([query for query in connection.queries
+                              if 'router_peer' in query['sql'] or
+                              'router_user' in query['sql']], [])
+        finally:
+            del settings.PEER_CACHE_SIZE
+
+        # without the cache, the user is still resolved up front
+        message = transport.incoming("test", "+echo third")
+        del connection.queries[:]
+        self.assertEqual(message.peer.user, user)
+        self.assertEqual(connection.queries, [])
+
+    def test_ingest(self):
+        from router.tests.transports import Dummy
+        transport = Dummy("dummy")
+
+        from django.conf import settings
+        settings.ROUTER_WORKERS = 1
+        try:
+            messages = []
+            from router.ingest import Ingest
+            transport._ingest = Ingest(messages.append)
+            message = transport.incoming("test", "+echo test")
+            self.assertTrue(transport.ingest is transport._ingest)
+            transport.ingest.join()
+        finally:
+            del settings.ROUTER_WORKERS
+            transport._ingest.stop()
+
+        # the message is saved, but not routed
+        self.assertEqual(messages, [message])
+        self.assertNotEqual(message.id, None)
+        self.assertEqual(message.forms.count(), 0)
+
+        # the queued message is routed by the ``recover`` command
+        from router.models import Incoming
+        self.assertEqual(Incoming.objects.get(queued=True), message)
+        from django.core.management import call_command
+        call_command('recover')
+        self.assertEqual(message.forms.get().replies.get().text, "test")
+        self.assertEqual(Incoming.objects.filter(queued=True).count(), 0)
+
+    def test_ingest_after_commit(self):
+        from router.tests.transports import Dummy
+        transport = Dummy("dummy")
+
+        managed = []
+        class Ingest(object):
+            def put(self, message):
+                from django.db import transaction
+                managed.append(transaction.is_managed())
+
+        from django.conf import settings
+        settings.ROUTER_WORKERS = 1
+        settings.ROUTING_TRANSACTION = True
+        try:
+            transport._ingest = Ingest()
+            transport.incoming("test", "+echo test")
+            transport.incoming_many([("test", "+echo test", None)])
+        finally:
+            del settings.ROUTER_WORKERS
+            del settings.ROUTING_TRANSACTION
+
+        # the messages are queued after the transaction
+        self.assertEqual(managed, [False, False])
+
 class KannelTest(FunctionalTestCase):
     INSTALLED_APPS = FunctionalTestCase.INSTALLED_APPS + (
         'router.tests',
         )
 
     USER_SETTINGS = {
+        'MESSAGE_ROUTER': 'router.router.Sequential',
         'FORMS': (
             'Echo',
             'Broken',
@@ -236,3 +505,129 @@ class KannelTest(FunctionalTestCase):
         self.assertEqual(message.delivery, delivery)
         self.assertEqual(message.delivered, True)
         self.assertEqual(message.sent, True)
+
+    def test_sender_pool(self):
+        request = self._make_request.get("/", {
+            'sender': '456',
+            'text': '+echo test',
+            'timestamp': str(time.mktime(
+                datetime.datetime(1999, 12, 31).timetuple())),
+            })
+
+        queued = []
+        class Sender(object):
+            def put(self, message):
+                from router.models import Outgoing
+                from router.models import Pending
+                self.committed = Outgoing.objects.filter(
+                    pk=message.pk).exists()
+                self.pending = Pending.objects.filter(
+                    message=message.pk).exists()
+                queued.append(message)
+
+        def fetch(request=None, **kwargs):
+            class response:
+                code = 202
+            return response()
+
+        kannel = self._make_kannel(fetch=fetch, workers=1)
+        kannel._sender = sender = Sender()
+
+        from django.conf import settings
+        settings.ROUTING_TRANSACTION = True
+        try:
+            response = self.view(request)
+        finally:
+            settings.ROUTING_TRANSACTION = False
+        self.assertEqual(response.status_code, "200 OK")
+
+        # the reply is queued once committed, but not yet sent
+        self.assertEqual(len(queued), 1)
+        self.assertTrue(sender.committed)
+        self.assertTrue(sender.pending)
+        from router.models import Outgoing
+        from router.models import Pending
+        self.assertEqual(Outgoing.objects.get().time, None)
+
+        kannel.send(queued[0])
+        self.assertNotEqual(Outgoing.objects.get().time, None)
+        self.assertEqual(Pending.objects.count(), 0)
+
+        # a message which is sent as soon as it's queued leaves no
+        # entry behind
+        class Sender(object):
+            def put(self, message):
+                kannel.send(message)
+
+        kannel._sender = Sender()
+        message = Outgoing(text=u"test", uri="kannel://456")
+        message.save()
+        self.assertNotEqual(Outgoing.objects.get(pk=message.pk).time, None)
+        self.assertEqual(Pending.objects.count(), 0)
+
+    def test_send_many(self):
+        queries = []
+        def fetch(request=None, **kwargs):
+            queries.append(dict(cgi.parse_qsl(request.get_full_url())))
+            class response:
+                code = 202
+            return response()
+
+        # queue the messages instead of sending them on save
+        class Sender(list):
+            put = list.append
+
+        kannel = self._make_kannel(fetch=fetch, batch_size=2, workers=1)
+        kannel._sender = Sender()
+
+        from router.models import Outgoing
+        messages = []
+        for ident, text in (("1", u"hello"), ("2", u"bye"),
+                            ("3", u"hello"), ("4", u"hello")):
+            message = Outgoing(text=text, uri="kannel://%s" % ident)
+            message.save()
+            messages.append(message)
+
+        kannel.send_many(messages)
+        self.assertEqual(
+            [(query['to'], query['text']) for query in queries],
+            [("1 3", "hello"), ("2", "bye"), ("4", "hello")])
+        self.assertEqual(Outgoing.objects.filter(time=None).count(), 0)
+
+        # delivery reports are requested for each message
+        del queries[:]
+        kannel.dlr_url = "http://localhost"
+        kannel.send_many(messages[::2])
+        self.assertEqual([query['to'] for query in queries], ["1", "3"])
+
+class ReloadTest(UnitTestCase):
+    def test_reload_settings(self):
+        import imp
+        import os
+        import tempfile
+
+        fd, path = tempfile.mkstemp(suffix='.py')
+        try:
+            os.write(fd, "FORMS = ('Echo', )\n")
+            os.close(fd)
+            imp.load_source("reload_settings", path)
+
+            from django.conf import settings
+            forms = getattr(settings, "FORMS", None)
+
+            from router.transports import Message
+            registry = Message._registry
+
+            f = open(path, 'w')
+            f.write("FORMS = ('Echo', 'Hello')\n")
+            f.close()
+
+            from router.wsgi import reload_settings
+            reload_settings("reload_settings")
+            try:
+                self.assertEqual(settings.FORMS, ('Echo', 'Hello'))
+                self.assertFalse(Message._registry is registry)
+            finally:
+                settings.FORMS = forms
+        finally:
+            os.unlink(path)
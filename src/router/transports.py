@@ -2,12 +2,16 @@ import re
 import sys
 import logging
 
+from copy import copy
+
 try:
     import sms
 except ImportError: # pragma: NOCOVER
     sms = None
 
 from datetime import datetime
+from functools import wraps
+from threading import local
 from threading import Thread
 from time import sleep
 from urllib import urlencode
@@ -15,25 +19,151 @@ from urllib2 import Request
 from urllib2 import urlopen
 from time import time as get_time
 from traceback import format_exc
+from traceback import format_exception
 from warnings import warn
 from weakref import ref as weakref
 
-from django.utils.importlib import import_module
+from django.db import transaction
+from django.db import DatabaseError
 from django.db.models import signals
 from django.dispatch import Signal
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
-from django.utils.functional import memoize
 
 from .models import Incoming
 from .models import Outgoing
+from .models import Pending
 from .models import Peer
-
-pre_route = Signal()
-post_route = Signal()
+from .models import User
+from .cache import LRUCache
+from .http import ConnectionPool
+from . import dispatch
+from .ingest import Ingest
+from .shadow import Shadow
+from .shadow import resolve
+
+pre_route = dispatch.Signal()
+post_route = dispatch.Signal()
+routed = dispatch.BatchSignal()
 kannel_event = Signal(providing_args=["request", "response"])
 hangup = Signal()
 
+_local = local()
+
+def reset_routers():
+    """Discard the resolved message routers and the peer cache.
+
+    The ``MESSAGE_ROUTER``, ``SHADOW_ROUTER``, ``FORMS`` and
+    ``PEER_CACHE_SIZE`` settings are read again when the next message
+    arrives. Messages which are being routed finish with the router
+    they started with and transports (e.g. a modem connection) are
+    not affected. The worker process pools of the discarded routers
+    are closed (see ``PARSE_PROCESSES``).
+    """
+
+    registry, Message._registry = Message._registry, {}
+    for value in registry.values():
+        close = getattr(value, 'close', None)
+        if close is not None:
+            close()
+
+def routing_transaction(func):
+    """Run the decorated function in a single database transaction
+    if the ``ROUTING_TRANSACTION`` setting is true.
+
+    Changes are committed even if the function raises an exception,
+    the same as when each change is committed on its own. Functions
+    passed to :func:`on_commit` are called after the commit.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not getattr(settings, "ROUTING_TRANSACTION", False):
+            return func(*args, **kwargs)
+
+        outer = getattr(_local, 'callbacks', None) is None
+        if outer:
+            _local.callbacks = []
+
+        committed = False
+        transaction.enter_transaction_management()
+        transaction.managed(True)
+        try:
+            try:
+                return func(*args, **kwargs)
+            finally:
+                try:
+                    transaction.commit()
+                    committed = True
+                except DatabaseError:
+                    transaction.rollback()
+        finally:
+            transaction.leave_transaction_management()
+            if outer:
+                callbacks = _local.callbacks
+                _local.callbacks = None
+                if committed:
+                    for callback, args in callbacks:
+                        callback(*args)
+
+    return wrapper
+
+def on_commit(func, *args):
+    """Call ``func`` with ``args`` when the current routing transaction
+    is committed, or right away if there is none (see
+    :func:`routing_transaction`). If the transaction is rolled back,
+    the function is not called."""
+
+    callbacks = getattr(_local, 'callbacks', None)
+    if callbacks is None:
+        func(*args)
+    else:
+        callbacks.append((func, args))
+
+def invalidate_peer(sender=None, instance=None, **kwargs):
+    # a routing worker may look up (and cache) the old row until the
+    # change is committed; discard the entry again after the commit
+    _discard_peer(instance.uri)
+    on_commit(_discard_peer, instance.uri)
+
+def invalidate_user(sender=None, instance=None, **kwargs):
+    deleted = kwargs.get('signal') is signals.post_delete
+    _discard_user(instance.pk, deleted)
+    on_commit(_discard_user, instance.pk, deleted)
+
+def _discard_peer(uri):
+    cache = Message._registry.get('peers')
+    if cache is not None:
+        cache.discard(uri)
+    cache = Message._registry.get('users')
+    if cache is not None:
+        cache.clear()
+
+def _discard_user(pk, deleted):
+    cache = Message._registry.get('users')
+    if cache is not None:
+        cache.discard(pk)
+    if deleted:
+        cache = Message._registry.get('peers')
+        if cache is not None:
+            cache.clear()
+
+def _connect_user(cls):
+    signals.post_save.connect(invalidate_user, sender=cls)
+    signals.post_delete.connect(invalidate_user, sender=cls)
+    for subclass in cls.__subclasses__():
+        _connect_user(subclass)
+
+def _connect_user_model(sender=None, **kwargs):
+    # the signals are sent with the concrete model as sender
+    if issubclass(sender, User):
+        _connect_user(sender)
+
+signals.post_save.connect(invalidate_peer, sender=Peer)
+signals.post_delete.connect(invalidate_peer, sender=Peer)
+signals.class_prepared.connect(_connect_user_model)
+_connect_user(User)
+
 def shrink(string): # pragma: NOCOVER
     return string.replace('\r', '').replace('\n', '').strip()
 
@@ -65,7 +195,8 @@ class Message(Transport):
     :meth:`incoming` method for processing.
     """
 
-    _cache = {}
+    # resolved routers; replaced (not changed) by ``reset_routers``
+    _registry = {}
 
     @property
     def router(self):
@@ -78,19 +209,132 @@ class Message(Transport):
                 "Missing setting ``MESSAGE_ROUTER``.")
         return self._get_router(path)
 
+    @staticmethod
     def _get_router(path):
+        registry = Message._registry
         try:
-            module_name, class_name = path.rsplit('.', 1)
-            module = import_module(module_name)
-            factory = getattr(module, class_name)
-        except: # pragma: NOCOVER
-            raise ImproperlyConfigured(
-                "Unable to resolve '%s'." % path)
+            return registry[path]
+        except KeyError:
+            return registry.setdefault(path, resolve(path)())
 
-        return factory()
+    @property
+    def peers(self):
+        """Cache of peer records by uri, or ``None`` unless the
+        ``PEER_CACHE_SIZE`` setting is set.
 
-    _get_router = staticmethod(memoize(_get_router, _cache, 1))
+        Entries are ``(peer, user_id)`` tuples. The cache is kept
+        up to date when peers and users are saved or deleted in this
+        process.
+        """
 
+        size = getattr(settings, "PEER_CACHE_SIZE", 0)
+        if size:
+            return self._get_cache('peers', size)
+
+    @property
+    def users(self):
+        """Cache of users by primary key, or ``None`` unless the
+        ``PEER_CACHE_SIZE`` setting is set."""
+
+        size = getattr(settings, "PEER_CACHE_SIZE", 0)
+        if size:
+            return self._get_cache('users', size)
+
+    @staticmethod
+    def _get_cache(key, size):
+        registry = Message._registry
+        try:
+            return registry[key]
+        except KeyError:
+            return registry.setdefault(key, LRUCache(size))
+
+    def get_peer(self, uri):
+        """Return the peer record for ``uri``, creating it if
+        necessary.
+
+        The user of the peer is resolved as well (and downcast to its
+        concrete model), such that forms can access it without
+        further queries.
+        """
+
+        cache = self.peers
+        entry = cache is not None and cache.get(uri)
+        if entry:
+            peer = copy(entry[0])
+        else:
+            peer, created = Peer.base_objects.select_related(
+                'user').get_or_create(uri=uri)
+            if cache is not None:
+                entry = copy(peer)
+                entry.__dict__.pop('_user_cache', None)
+                cache.set(uri, (entry, peer.user_id))
+
+        self._resolve_user(peer)
+        return peer
+
+    def _resolve_user(self, peer):
+        if peer.user_id is not None:
+            peer.user = self.get_user(
+                peer.user_id, peer.__dict__.get('_user_cache'))
+
+    def get_user(self, user_id, user=None):
+        """Return the user with the primary key ``user_id``, downcast
+        to its concrete model.
+
+        The ``user`` argument may provide an instance which has
+        already been loaded (e.g. using ``select_related``). When the
+        peer cache is enabled, users are cached as well.
+        """
+
+        cache = self.users
+        if cache is not None:
+            cached = cache.get(user_id)
+            if cached is not None:
+                return copy(cached)
+
+        if user is None:
+            user = User.base_objects.get(pk=user_id)
+        user = user.get_real_instance()
+        if cache is not None:
+            cache.set(user_id, copy(user))
+        return user
+
+    @property
+    def shadow(self):
+        """Resolve shadow router defined in the ``SHADOW_ROUTER``
+        setting, or ``None`` if not set."""
+
+        path = getattr(settings, "SHADOW_ROUTER", None)
+        if path is not None:
+            return self._get_shadow(settings.MESSAGE_ROUTER, path)
+
+    @staticmethod
+    def _get_shadow(primary, path):
+        registry = Message._registry
+        key = primary, path
+        try:
+            return registry[key]
+        except KeyError:
+            return registry.setdefault(key, Shadow(primary, path))
+
+    @property
+    def ingest(self):
+        """The routing worker pool, created on first use; ``None``
+        unless the ``ROUTER_WORKERS`` setting is set."""
+
+        workers = getattr(settings, "ROUTER_WORKERS", 0)
+        if not workers:
+            return None
+
+        ingest = self.__dict__.get('_ingest')
+        if ingest is None:
+            size = getattr(settings, "ROUTER_QUEUE_SIZE", 1000)
+            ingest = self.__dict__.setdefault('_ingest', Ingest(
+                routing_transaction(self.route), workers, size))
+            hangup.connect(ingest.stop, weak=False)
+        return ingest
+
+    @routing_transaction
     def incoming(self, ident, text, time=None):
         """Route incoming text message.
 
@@ -98,20 +342,47 @@ class Message(Transport):
         set to a true value), all exceptions are let through to the
         calling method. Otherwise a warning is logged with the full
         traceback while the exception is suppressed.
+
+        If the ``ROUTING_TRANSACTION`` setting is true, the message is
+        routed in a single database transaction with a savepoint for
+        each form, such that a form which fails rolls back only its
+        own changes. If the database doesn't support savepoints (e.g.
+        SQLite), the changes made by a failing form are kept, the same
+        as without this setting.
+
+        If the ``ROUTER_WORKERS`` setting is set to the number of
+        worker threads, the message is saved and put on a queue (of at
+        most ``ROUTER_QUEUE_SIZE`` messages, default is ``1000``) to
+        be routed in the background once the message has been
+        committed; see :class:`router.ingest.Ingest`. Until then, the
+        message is marked as queued, such that it can be routed with
+        the ``recover`` command if the process exits first.
         """
 
         time = time or datetime.now()
         message = Incoming(text=text, time=time)
 
         # make sure we have a peer record for this sender
-        message.uri = "%s://%s" % (self.name, ident)
-        peer, created = Peer.objects.get_or_create(uri=message.uri)
-        if created: peer.save()
+        message.peer = self.get_peer("%s://%s" % (self.name, ident))
 
         # save message
+        ingest = self.ingest
+        if ingest is not None:
+            message.queued = True
         message.save()
 
-        pre_route.send(sender=message)
+        if ingest is not None:
+            on_commit(ingest.put, message)
+        else:
+            self.route(message)
+
+        return message
+
+    def route(self, message):
+        """Route a saved incoming message."""
+
+        if pre_route.active:
+            pre_route.send(sender=message)
         try:
             self.router.route(message)
         except:
@@ -120,21 +391,124 @@ class Message(Transport):
             else:
                 cls, exc, tb = sys.exc_info()
                 warn("%s ERROR [%s] - %s.\n\n%s" % (
-                    time.isoformat(),
+                    message.time.isoformat(),
                     type(exc).__name__,
                     repr(message.text.encode('utf-8')),
                     format_exc(exc)))
         finally:
-            post_route.send(sender=message)
+            if message.queued:
+                Incoming.base_objects.filter(pk=message.pk).update(
+                    queued=None)
+                message.queued = None
+            if post_route.active:
+                post_route.send(sender=message)
+            routed.add(message)
+
+        shadow = self.shadow
+        if shadow is not None:
+            shadow.submit(message.text)
+
+    @routing_transaction
+    def incoming_many(self, messages):
+        """Route a batch of incoming text messages.
+
+        The ``messages`` argument is a sequence of ``(ident, text,
+        time)`` tuples. The outcome is the same as calling
+        :meth:`incoming` for each message in turn, but peers are
+        looked up in a single query and routers which provide a
+        ``route_many`` method handle the messages in one go (unless
+        the messages are routed by worker threads).
+
+        Returns the list of incoming message objects.
+        """
 
-        return message
+        now = datetime.now()
+        incoming = []
+        for ident, text, time in messages:
+            message = Incoming(text=text, time=time or now)
+            message.uri = "%s://%s" % (self.name, ident)
+            incoming.append(message)
+
+        # make sure we have a peer record for each sender
+        uris = set(message.uri for message in incoming)
+        peers = {}
+        cache = self.peers
+        if cache is not None:
+            for uri in uris:
+                entry = cache.get(uri)
+                if entry is not None:
+                    peers[uri] = entry[0]
+        missing = uris.difference(peers)
+        if missing:
+            for peer in Peer.base_objects.select_related('user').filter(
+                uri__in=missing):
+                peers[peer.uri] = peer
+            for uri in missing.difference(peers):
+                peers[uri] = Peer.base_objects.create(uri=uri)
+            if cache is not None:
+                for uri in missing:
+                    entry = copy(peers[uri])
+                    entry.__dict__.pop('_user_cache', None)
+                    cache.set(uri, (entry, entry.user_id))
+
+        ingest = self.ingest
+        for message in incoming:
+            peer = copy(peers[message.uri])
+            self._resolve_user(peer)
+            message.peer = peer
+            if ingest is not None:
+                message.queued = True
+            message.save()
+
+        if ingest is not None:
+            for message in incoming:
+                on_commit(ingest.put, message)
+            return incoming
+
+        for message in incoming:
+            if pre_route.active:
+                pre_route.send(sender=message)
+
+        router = self.router
+        try:
+            route_many = getattr(router, "route_many", None)
+            if route_many is not None:
+                errors = route_many(incoming)
+            else:
+                errors = []
+                for message in incoming:
+                    try:
+                        router.route(message)
+                    except:
+                        errors.append((message, sys.exc_info()))
+
+            for message, (cls, exc, tb) in errors:
+                if settings.DEBUG:
+                    raise cls, exc, tb
+                warn("%s ERROR [%s] - %s.\n\n%s" % (
+                    message.time.isoformat(),
+                    type(exc).__name__,
+                    repr(message.text.encode('utf-8')),
+                    "".join(format_exception(cls, exc, tb))))
+        finally:
+            for message in incoming:
+                if post_route.active:
+                    post_route.send(sender=message)
+                routed.add(message)
+
+        shadow = self.shadow
+        if shadow is not None:
+            for message in incoming:
+                shadow.submit(message.text)
+
+        return incoming
 
 class GSM(Message): # pragma: NOCOVER
     """GSM transport.
 
     :param name: Transport name
 
-    :param options: ``DEVICE`` is the modem serial port (e.g. ``\"COM1\"``) or special device path (e.g. ``\"/dev/ttyUSB0\"``); ``LOG_LEVEL`` sets the logging level (default is ``\"WARN\"`` which is quiet unless there's an error); ``DCS`` is the data coding scheme (default is ``0`` for normal delivery, ``16`` sends flash messages); ``VALIDITY`` sets the message expiration (use ``167`` for one day); ``STORAGE`` sets the preferred message storage (use ``ME`` for internal, ``SM`` for SIM card or ``MT`` for either); set ``DELIVERY`` to a true value to request delivery reports (may incur an extra charge, use with caution).
+    :param options: ``DEVICE`` is the modem serial port (e.g. ``\"COM1\"``) or special device path (e.g. ``\"/dev/ttyUSB0\"``); ``LOG_LEVEL`` sets the logging level (default is ``\"WARN\"`` which is quiet unless there's an error); ``DCS`` is the data coding scheme (default is ``0`` for normal delivery, ``16`` sends flash messages); ``VALIDITY`` sets the message expiration (use ``167`` for one day); ``STORAGE`` sets the preferred message storage (use ``ME`` for internal, ``SM`` for SIM card or ``MT`` for either); set ``DELIVERY`` to a true value to request delivery reports (may incur an extra charge, use with caution); ``BATCH_SIZE`` is the maximum number of pending messages sent per polling cycle (default is ``100``); a message which fails to be sent is retried later with an increasing delay.
 
     Example::
 
@@ -154,6 +528,7 @@ class GSM(Message): # pragma: NOCOVER
     log_level = "WARN"
     storage = ""
     timeout = 3
+    batch_size = 100
 
     _hangup = False
 
@@ -214,6 +589,7 @@ class GSM(Message): # pragma: NOCOVER
             if len(messages) > 0:
                 self.logger.debug("Received %d message(s)." % len(messages))
 
+            batch = []
             for message in messages:
                 ignored = ""
                 if len(message.number) < 6:
@@ -222,15 +598,21 @@ class GSM(Message): # pragma: NOCOVER
                     message.number, repr(
                         message.text.encode('utf-8')), ignored))
                 if not ignored:
-                    self.incoming(message.number, message.text, message.date)
+                    batch.append((message.number, message.text, message.date))
 
-            # outgoing
-            messages = Outgoing.objects.filter(
-                time=None, peer__uri__startswith="%s://" % self.name)
-            if len(messages) > 0:
-                self.logger.debug("Sending %d message(s)..." % len(messages))
+            if batch:
+                self.incoming_many(batch)
 
-            for message in messages.all():
+            # outgoing; messages which failed to be sent are retried
+            # when due (see ``Pending.postpone``)
+            entries = list(Pending.objects.select_related('message').filter(
+                transport=self.name, retry__lte=datetime.now()).order_by(
+                'retry')[:int(self.batch_size)])
+            if len(entries) > 0:
+                self.logger.debug("Sending %d message(s)..." % len(entries))
+
+            for entry in entries:
+                message = entry.message
                 try:
                     self.logger.debug("%s <-- %s" % (
                         message.ident, repr(message.text.encode('utf-8'))))
@@ -243,6 +625,7 @@ class GSM(Message): # pragma: NOCOVER
                         self.logger.debug("Sending message failed "
                                           "before text was sent "
                                           "(%s)." % shrink(result))
+                        entry.postpone()
                         continue
 
                     # send text
@@ -263,6 +646,7 @@ class GSM(Message): # pragma: NOCOVER
 
                 except sms.ModemError, error:
                     self.logger.warn(error)
+                    entry.postpone()
                     sleep(1)
                 else:
                     self.logger.debug("Message sent with delivery id: %s." % \
@@ -388,7 +772,7 @@ class Kannel(Message):
 
     :param name: Transport name
 
-    :param options: Dictionary; define ``'SMS_URL'`` for the URL for the *sendsms* service and ``'DLR_URL'`` to set the delivery confirmation reply
+    :param options: Dictionary; define ``'SMS_URL'`` for the URL for the *sendsms* service and ``'DLR_URL'`` to set the delivery confirmation reply; set ``'WORKERS'`` to the number of sender threads to send messages in the background (the queue holds at most ``'QUEUE_SIZE'`` messages, default is ``1000``); requests are made on persistent connections, of which at most ``'POOL_SIZE'`` (default is ``4``, use ``0`` to open a new connection for each request) are kept open for up to ``'POOL_IDLE_TIMEOUT'`` seconds (default is ``30``); ``'BATCH_SIZE'`` is the maximum number of recipients of a message sent in one request (default is ``100``, only if ``'DLR_URL'`` is not set)
 
     Example configuration::
 
@@ -407,6 +791,11 @@ class Kannel(Message):
     dlr_url = None
 
     timeout = 30.0
+    workers = 0
+    queue_size = 1000
+    pool_size = 4
+    pool_idle_timeout = 30.0
+    batch_size = 100
 
     def __init__(self, *args, **kwargs):
         super(Kannel, self).__init__(*args, **kwargs)
@@ -428,23 +817,84 @@ class Kannel(Message):
         def on_outgoing(sender=None, instance=None, created=False, **kwargs):
             transport = reference()
             if transport is not None:
-                if created is True and instance.transport == transport.name:
+                if created is True and instance.transport == transport.name \
+                       and transport.sender is None:
                     transport.send(instance)
 
         signals.post_save.connect(on_outgoing, sender=Outgoing, weak=False)
         del on_outgoing
 
+        # with sender threads, messages are queued once the queue
+        # entry has been saved, such that a sender thread which is
+        # quick to send the message also removes the entry
+        def on_pending(sender=None, instance=None, created=False, **kwargs):
+            transport = reference()
+            if transport is not None:
+                if created is True and instance.transport == transport.name:
+                    sender = transport.sender
+                    if sender is not None:
+                        on_commit(sender.put, copy(instance.message))
+
+        signals.post_save.connect(on_pending, sender=Pending, weak=False)
+        del on_pending
+
+    @property
+    def sender(self):
+        """The sender worker pool, created on first use; ``None``
+        unless the ``WORKERS`` option is set.
+
+        Outgoing messages are put on the queue of the pool when their
+        :class:`router.models.Pending` entry has been saved and
+        committed (see :func:`on_commit`) and sent by the
+        worker threads, such that the request which caused the reply
+        does not wait for the *sendsms* service. Each worker takes up
+        to ``BATCH_SIZE`` queued messages at a time and passes them to
+        :meth:`send_many`.
+        """
+
+        workers = int(self.workers)
+        if not workers:
+            return None
+
+        sender = self.__dict__.get('_sender')
+        if sender is None:
+            sender = self.__dict__.setdefault('_sender', Ingest(
+                self.send_many, workers, int(self.queue_size),
+                "router.transports.kannel", int(self.batch_size)))
+            hangup.connect(sender.stop, weak=False)
+        return sender
+
+    @property
+    def pool(self):
+        """The HTTP connection pool, created on first use; ``None`` if
+        the ``POOL_SIZE`` option is ``0``."""
+
+        size = int(self.pool_size)
+        if not size:
+            return None
+
+        pool = self.__dict__.get('_pool')
+        if pool is None:
+            pool = self.__dict__.setdefault('_pool', ConnectionPool(
+                size, float(self.pool_idle_timeout)))
+            hangup.connect(pool.close, weak=False)
+        return pool
+
     def fetch(self, request, **kwargs): # pragma: NOCOVER
         """Fetch HTTP request.
 
         Used internally by the Kannel transport.
 
-        This method operates synchronously. Note that the method is a
-        convenience for writing tests without setting up an HTTP
-        server (replace with a mock implementation).
+        This method operates synchronously, using a persistent
+        connection from :attr:`pool` if available. Note that the
+        method is a convenience for writing tests without setting up
+        an HTTP server (replace with a mock implementation).
         """
 
-        return urlopen(request, **kwargs)
+        pool = self.pool
+        if pool is None:
+            return urlopen(request, **kwargs)
+        return pool.urlopen(request, **kwargs)
 
     def handle(self, request):
         """
@@ -488,7 +938,7 @@ class Kannel(Message):
         # SMSC, 16: Non-Delivered to SMSC; since we use the bitmask 3,
         # we can simply check for success or failure
         if status == 1:
-            message = Outgoing.objects.get(pk=message_id)
+            message = Outgoing.base_objects.get(pk=message_id)
             message.delivery = time
             message.save()
         else:
@@ -502,6 +952,42 @@ class Kannel(Message):
         return "", "200 OK"
 
     def send(self, message):
+        """Send ``message`` using the *sendsms* service and record the
+        time it was sent."""
+
+        self._sendsms([message])
+
+    def send_many(self, messages):
+        """Send ``messages``. Unless delivery reports are requested
+        (``DLR_URL``), messages with identical text are sent in one
+        request with up to ``BATCH_SIZE`` recipients (default is
+        ``100``). The time each message was sent is recorded."""
+
+        size = int(self.batch_size)
+        if self.dlr_url is not None or size <= 1:
+            groups = [[message] for message in messages]
+        else:
+            texts = {}
+            groups = []
+            for message in messages:
+                group = texts.get(message.text)
+                if group is None or len(group) >= size:
+                    group = texts[message.text] = []
+                    groups.append(group)
+                group.append(message)
+
+        errors = []
+        for group in groups:
+            try:
+                self._sendsms(group)
+            except Exception:
+                errors.append(sys.exc_info())
+
+        if errors:
+            cls, exc, tb = errors[0]
+            raise cls, exc, tb
+
+    def _sendsms(self, messages):
         url = self.sms_url
         if url is None: # PRAGMA: nocover
             raise ValueError("Must set ``SMS_URL`` parameter for "
@@ -511,14 +997,14 @@ class Kannel(Message):
             url += "?"
 
         query = {
-            'to': message.ident,
-            'text': message.text,
+            'to': " ".join(message.ident for message in messages),
+            'text': messages[0].text,
             }
 
         if self.dlr_url is not None:
             query.update({
                 'dlr-url': '%s?status=%%d&id=%d&timestamp=%%T' % (
-                    self.dlr_url, message.id),
+                    self.dlr_url, messages[0].id),
                 'dlr-mask': '3'
                 })
 
@@ -528,5 +1014,7 @@ class Kannel(Message):
 
         response = self.fetch(request, timeout=self.timeout)
         if response.code // 100 == 2:
-            message.time = datetime.now()
-            message.save()
+            now = datetime.now()
+            for message in messages:
+                message.time = now
+                message.save()
@@ -1,4 +1,5 @@
 import imp
+import sys
 import signal
 import functools
 from django import conf
@@ -13,10 +14,44 @@ _transports = {}
 # store old interrupt handlers
 _default_handlers = {}
 
+# settings which are applied on ``SIGUSR1``
+RELOADABLE_SETTINGS = (
+    "FORMS",
+    "PINNED_FORMS",
+    "MESSAGE_ROUTER",
+    "SHADOW_ROUTER",
+    "ADAPTIVE_INTERVAL",
+    "PARSE_CACHE_SIZE",
+    "PEER_CACHE_SIZE",
+    "PARSE_BUDGET",
+    "PARSE_BUDGET_ERROR",
+    )
+
 def shutdown(signal, signum, frame):
     signal.send(sender=signum)
     _default_handlers[signum](signum, frame)
 
+def reload_settings(name, signum=None, frame=None):
+    """Read the settings module again and apply the routing settings
+    (listed in ``RELOADABLE_SETTINGS``) to the running process.
+
+    Settings which are not defined in the module are left unchanged;
+    to turn off the shadow router, set ``SHADOW_ROUTER = None``.
+    """
+
+    module = sys.modules[name]
+    path = module.__file__
+    if path.endswith('.pyc') or path.endswith('.pyo'):
+        path = path[:-1]
+    module = imp.load_source(name, path)
+
+    for key in RELOADABLE_SETTINGS:
+        if hasattr(module, key):
+            setattr(conf.settings, key, getattr(module, key))
+
+    from .transports import reset_routers
+    reset_routers()
+
 def make_app(config, settings=None):
     imp.load_source("settings", settings)
     settings = conf.Settings("settings")
@@ -27,10 +62,16 @@ def make_app(config, settings=None):
 def make_app_from_settings(settings):
     # install signal handlers
     from .transports import hangup
+    from .transports import routed
+    hangup.connect(routed.flush, weak=False)
     handler = functools.partial(shutdown, hangup)
     _default_handlers[signal.SIGHUP] = signal.signal(signal.SIGHUP, handler)
     _default_handlers[signal.SIGINT] = signal.signal(signal.SIGINT, handler)
 
+    # reload routing configuration on ``SIGUSR1``
+    name = getattr(settings, "SETTINGS_MODULE", None) or settings.__name__
+    signal.signal(signal.SIGUSR1, functools.partial(reload_settings, name))
+
     # start transports
     for name, options in getattr(settings, "TRANSPORTS", {}).items():
         try: